@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import aiohttp
+import requests
+
+from utils.async_client import YandexClient
+from utils.geocode_cache import GeocodeCache, normalize_query
+from utils.geocoder import geocode_request
+from utils.rate_limit import TokenBucket
+
+CSV_FIELDS = ("query", "status", "address", "lon", "lat", "postal_code")
+
+
+def read_queries(path, column=None):
+    """Streams address strings from a text file (one per line) or a CSV column."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if column:
+            for row in csv.DictReader(f):
+                if row.get(column, "").strip():
+                    yield row[column].strip()
+        else:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+
+def read_checkpoint(path):
+    """Returns normalized queries already present in the output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    # Последняя строка без перевода строки оборвана при прерывании: ResultWriter её удалит,
+    # а запрос повторится. Остальные повреждённые строки пропускаются по одной
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = (line for line in f if line.endswith("\n"))
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(lines):
+                if row.get("query") and row.get("status"):
+                    done.add(normalize_query(row["query"]))
+        else:
+            for line in lines:
+                try:
+                    done.add(normalize_query(json.loads(line)["query"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return done
+
+
+def drop_partial_line(path, block_size=4096):
+    """Truncates the file after its last newline, removing a line cut off by an interruption."""
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+class ResultWriter:
+    """Appends geocoding results to a JSONL or CSV file, flushing after every row."""
+
+    def __init__(self, path):
+        self.is_csv = path.lower().endswith(".csv")
+        # Новые строки не должны приклеиться к оборванной последней строке
+        if os.path.exists(path):
+            drop_partial_line(path)
+        write_header = self.is_csv and (not os.path.exists(path) or os.path.getsize(path) == 0)
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            if write_header:
+                self.writer.writeheader()
+
+    def write(self, query, result):
+        row = {"query": query, "status": "ok" if result else "not_found"}
+        if result:
+            row.update({"address": result["address"], "lon": result["coords"][0],
+                        "lat": result["coords"][1], "postal_code": result["postal_code"]})
+        if self.is_csv:
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def geocode_one(query, cache, rate_limiter):
+    if cache is not None:
+        cached = cache.get_forward(query)
+        if cached is not None:
+            return cached, True
+
+    rate_limiter.acquire()
+    result = geocode_request(geocode_query=query)
+    if cache is not None and result is not None:
+        cache.put_forward(query, result)
+    return result, False
+
+
+async def geocode_one_async(query, cache, client):
+    if cache is not None:
+        cached = cache.get_forward(query)
+        if cached is not None:
+            return cached, True
+
+    # Ограничение частоты запросов выполняет сам клиент
+    result = await client.geocode(query)
+    if cache is not None and result is not None:
+        cache.put_forward(query, result)
+    return result, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетное геокодирование адресов с возможностью продолжения.")
+    parser.add_argument("input", help="текстовый файл (адрес в строке) или CSV (см. --column)")
+    parser.add_argument("output", help="файл результатов .jsonl или .csv; он же служит контрольной точкой")
+    parser.add_argument("-c", "--column", help="имя столбца с адресом во входном CSV")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="число параллельных запросов")
+    parser.add_argument("-r", "--rate", type=float, default=10.0, help="не более N запросов к API в секунду")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш геокодера")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads",
+                        help="пул потоков или asyncio-клиент с общим пулом соединений")
+    args = parser.parse_args(argv)
+
+    done = read_checkpoint(args.output)
+    if done:
+        print(f"Продолжение: {len(done)} адресов уже обработано.")
+
+    cache = None if args.no_cache else GeocodeCache()
+    if cache is not None:
+        cache.load()
+    rate_limiter = TokenBucket(args.rate)
+    writer = ResultWriter(args.output)
+
+    max_pending = args.workers * 4
+    pending = {}
+    counters = {"ok": 0, "not_found": 0, "cached": 0, "errors": 0, "skipped": 0}
+    started = time.monotonic()
+
+    def collect(futures):
+        for future in futures:
+            query = pending.pop(future)
+            try:
+                result, from_cache = future.result()
+            except (requests.exceptions.RequestException, aiohttp.ClientError, asyncio.TimeoutError,
+                    KeyError, ValueError) as e:
+                # Ошибочные адреса не записываются и будут повторены при следующем запуске
+                counters["errors"] += 1
+                done.discard(normalize_query(query))
+                print(f"Ошибка для '{query}': {e}")
+                continue
+            writer.write(query, result)
+            counters["ok" if result else "not_found"] += 1
+            counters["cached"] += from_cache
+
+            processed = counters["ok"] + counters["not_found"]
+            if processed % 100 == 0:
+                elapsed = time.monotonic() - started
+                print(f"Обработано {processed} адресов ({processed / elapsed:.1f} в секунду)")
+
+    # Оба варианта возвращают concurrent.futures.Future, поэтому дальше код общий
+    if args.engine == "async":
+        client = YandexClient(pool_size=args.workers, rate_limiter=rate_limiter)
+        executor = None
+
+        def submit(query):
+            return client.submit(geocode_one_async(query, cache, client.client))
+    else:
+        client = None
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+
+        def submit(query):
+            return executor.submit(geocode_one, query, cache, rate_limiter)
+
+    try:
+        for query in read_queries(args.input, args.column):
+            key = normalize_query(query)
+            if key in done:
+                counters["skipped"] += 1
+                continue
+            done.add(key)
+
+            pending[submit(query)] = query
+            if len(pending) >= max_pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    except KeyboardInterrupt:
+        print("Прервано. Запустите команду снова, чтобы продолжить.")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if client is not None:
+            client.close()
+        writer.close()
+        if cache is not None:
+            cache.save()
+
+    elapsed = time.monotonic() - started
+    processed = counters["ok"] + counters["not_found"]
+    print(f"Готово за {elapsed:.1f} с: найдено {counters['ok']}, не найдено {counters['not_found']}, "
+          f"ошибок {counters['errors']}, из кэша {counters['cached']}, "
+          f"пропущено (повторы и уже обработанные) {counters['skipped']}, "
+          f"{processed / elapsed if elapsed else 0:.1f} адресов в секунду")
+    return 1 if counters["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,55 +1,36 @@
+import sqlite3
 import sys
 import requests
-import math
 
-from PyQt6.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout,
+from PyQt6.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout, QFileDialog,
                              QCheckBox, QLineEdit, QPushButton, QHBoxLayout)
-from PyQt6.QtGui import QPixmap, QKeyEvent, QMouseEvent
-from PyQt6.QtCore import Qt, QPoint
+from PyQt6.QtGui import QKeyEvent, QMouseEvent
+from PyQt6.QtCore import Qt, QPoint, QTimer
+
+from utils.async_client import YandexClient
+from utils.cache_policy import CachePolicy
+from utils.config import MAP_CACHE_SOFT_TTL, MAP_CACHE_HARD_TTL, TILE_STORE_MAX_BYTES
+from utils.geocode_cache import GeocodeCache
+from utils.map_loader import MapLoader
+from utils.marker_layer import MarkerLayer, load_points
+from utils.metrics import NULL_SPAN, metrics
+from utils.org_store import OrganizationStore
+from utils.overlay import SearchMarkerLayer, render_overlays
+from utils.prefetch import Prefetcher
+from utils.projection import MercatorProjection
+from utils.preview import render_preview
+from utils.qt_bridge import FutureBridge
+from utils.region_pack import is_offline_mode, set_offline_mode
+from utils.route_layer import RouteLayer, load_tracks
+from utils.tile_store import TileStore
+from utils.tiles import TileViewport
 
 
-# from utils.geo_utils import haversine_distance
-def haversine_distance(point1_lonlat, point2_lonlat):
-    """
-    Calculates the great-circle distance between two points
-    on the earth (specified in decimal degrees) using Haversine formula.
-
-    Args:
-        point1_lonlat (tuple): (longitude, latitude) for first point in degrees.
-        point2_lonlat (tuple): (longitude, latitude) for second point in degrees.
-
-    Returns:
-        float: Distance in kilometers.
-    """
-    lon1, lat1 = point1_lonlat
-    lon2, lat2 = point2_lonlat
-
-    R = 6371.0
-
-    lon1_rad, lat1_rad, lon2_rad, lat2_rad = map(math.radians, [lon1, lat1, lon2, lat2])
-
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    distance = R * c
-    return distance
-
-
-# Используем учебные ключи из предыдущего кода
-GEOCODER_API_KEY = "8013b162-6b42-4997-9691-77b7074026e0"
-STATIC_MAPS_API_KEY = "f3a0fe3a-b07e-4840-a1da-06f18b2ddf13"
-GEOSEARCH_API_KEY = "dda3ddba-c9ea-4ead-9010-f43fbc15c6e3"
-
-# API Серверы
-GEOCODER_API_SERVER = "http://geocode-maps.yandex.ru/1.x/"
-STATIC_MAPS_API_SERVER = "https://static-maps.yandex.ru/v1"
-GEOSEARCH_API_SERVER = "https://search-maps.yandex.ru/v1/"
-
 MAP_WIDTH, MAP_HEIGHT = 600, 450
-ZOOM_FACTOR = 1.5
+ZOOM_FACTOR = 2.0  # один уровень сетки тайлов
 MOVE_STEP_FACTOR = 0.8
+NAVIGATION_DEBOUNCE_MS = 150  # нажатия в пределах этого интервала объединяются в один запрос
+NAVIGATION_MAX_WAIT_MS = 400  # при удержании клавиши карта всё равно запрашивается не реже
 MIN_SPN = 0.0005
 MAX_SPN = 80.0
 MIN_LAT, MAX_LAT = -85.05112878, 85.05112878
@@ -66,6 +47,11 @@ class MapViewerApp(QWidget):
         self.lat = 55.755814
         self.spn_lon = 0.05
         self.spn_lat = 0.02
+        self.zoom = None
+        self.viewport = None
+        self.displayed_pixmap = None
+        self.displayed_viewport = None
+        self.view_span = NULL_SPAN
         self.map_type = "map"
         self.current_theme = "light"
         self.marker_coords = None
@@ -78,15 +64,71 @@ class MapViewerApp(QWidget):
         self.postal_code_checkbox = QCheckBox("Добавить индекс", self)
         self.address_label = QLabel("Полный адрес / Организация:", self)
         self.theme_checkbox = QCheckBox("Тёмная тема", self)
+        self.offline_checkbox = QCheckBox("Офлайн", self)
+        self.offline_checkbox.setChecked(is_offline_mode())
         self.address_display = QLabel("", self)
         self.reset_button = QPushButton("Сброс", self)
+        self.markers_button = QPushButton("Метки из файла…", self)
+        self.route_button = QPushButton("Маршрут из файла…", self)
+        self.route_label = QLabel("", self)
         self.image_label = QLabel(self)
         self.search_button = QPushButton("Искать", self)
         self.search_input = QLineEdit(self)
 
+        self.geocode_cache = GeocodeCache()
+        self.geocode_cache.load()
+        self.org_store = OrganizationStore()
+
+        # Геокодирование и поиск организаций выполняются вне GUI-потока
+        self.yandex_client = YandexClient()
+        self.lookups = FutureBridge(self)
+        self.lookups.finished.connect(self.on_lookup_finished)
+        self.lookups.failed.connect(self.on_lookup_failed)
+        self.lookup_generation = 0
+
+        # Слои, которые рисуются поверх загруженной карты
+        self.route_layer = RouteLayer()
+        self.marker_layer = MarkerLayer()
+        self.search_marker = SearchMarkerLayer()
+        self.overlay_layers = [self.route_layer, self.marker_layer, self.search_marker]
+
+        # Фоновая загрузка карты
+        self.map_loader = MapLoader(self, tile_store=self.create_tile_store())
+        self.map_loader.map_loaded.connect(self.on_map_loaded)
+        self.map_loader.map_failed.connect(self.on_map_failed)
+        self.prefetcher = Prefetcher(self.map_loader, self)
+
+        # Отложенная загрузка карты при навигации с клавиатуры
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(NAVIGATION_DEBOUNCE_MS)
+        self.reload_timer.timeout.connect(self.load_map)
+        # Автоповтор клавиш чаще интервала отложенной загрузки, поэтому ожидание ограничено сверху
+        self.max_wait_timer = QTimer(self)
+        self.max_wait_timer.setSingleShot(True)
+        self.max_wait_timer.setInterval(NAVIGATION_MAX_WAIT_MS)
+        self.max_wait_timer.timeout.connect(self.load_map)
+
         self.initUI()
         self.load_map()
 
+    @staticmethod
+    def create_tile_store():
+        try:
+            return TileStore(policy=CachePolicy(MAP_CACHE_SOFT_TTL, MAP_CACHE_HARD_TTL),
+                             max_bytes=TILE_STORE_MAX_BYTES)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Хранилище тайлов недоступно: {e}")
+            return None
+
+    def closeEvent(self, event):
+        self.yandex_client.close()
+        if self.map_loader.tile_store is not None:
+            self.map_loader.tile_store.close()
+        self.geocode_cache.save()
+        metrics.close()
+        super().closeEvent(event)
+
     def initUI(self):
         self.setWindowTitle('Карта v0.12')
         self.setGeometry(100, 100, MAP_WIDTH, MAP_HEIGHT + 120)
@@ -108,6 +150,9 @@ class MapViewerApp(QWidget):
         controls_layout = QHBoxLayout()
         controls_layout.addWidget(self.theme_checkbox)
         controls_layout.addWidget(self.postal_code_checkbox)
+        controls_layout.addWidget(self.offline_checkbox)
+        controls_layout.addWidget(self.markers_button)
+        controls_layout.addWidget(self.route_button)
         controls_layout.addStretch(1)
 
         # Основной макет
@@ -117,6 +162,7 @@ class MapViewerApp(QWidget):
         main_layout.addWidget(self.address_label)
         main_layout.addWidget(self.address_display)
         main_layout.addLayout(controls_layout)
+        main_layout.addWidget(self.route_label)
         self.setLayout(main_layout)
 
         # Подключение сигналов
@@ -125,56 +171,141 @@ class MapViewerApp(QWidget):
         self.reset_button.clicked.connect(self.reset_search_result)
         self.theme_checkbox.stateChanged.connect(self.toggle_theme)
         self.postal_code_checkbox.stateChanged.connect(self.toggle_postal_code)
+        self.offline_checkbox.stateChanged.connect(self.toggle_offline)
+        self.markers_button.clicked.connect(self.load_marker_file)
+        self.route_button.clicked.connect(self.load_route_file)
 
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         self.show()
 
+    def schedule_map_reload(self):
+        # Каждое новое нажатие откладывает запрос, но не дольше NAVIGATION_MAX_WAIT_MS
+        # с первого из них: при удержании клавиши промежуточные виды загружаются с этим шагом
+        self.prefetcher.cancel()
+        if not self.max_wait_timer.isActive():
+            self.max_wait_timer.start()
+        self.reload_timer.start()
+        self.show_preview()
+
+    def show_preview(self):
+        # Пока настоящая карта загружается, показываем сдвинутую/масштабированную текущую
+        if self.displayed_pixmap is None:
+            return
+        target = TileViewport.from_span(self.lon, self.lat, self.spn_lon, MAP_WIDTH, MAP_HEIGHT)
+        preview = render_preview(self.displayed_pixmap, self.displayed_viewport, target)
+        self.image_label.setPixmap(render_overlays(preview, target, self.overlay_layers))
+
     def load_map(self):
+        self.reload_timer.stop()
+        self.max_wait_timer.stop()
+
         # Проверка и корректировка границ координат и масштаба
         self.lon = max(MIN_LON, min(self.lon, MAX_LON))
         self.lat = max(MIN_LAT, min(self.lat, MAX_LAT))
         self.spn_lon = max(MIN_SPN, min(self.spn_lon, MAX_SPN))
         self.spn_lat = max(MIN_SPN, min(self.spn_lat, MAX_SPN))
 
-        # Формирование параметров для запроса
-        ll = f"{self.lon:.6f},{self.lat:.6f}"
-        spn = f"{self.spn_lon:.6f},{self.spn_lat:.6f}"
-        size = f"{MAP_WIDTH},{MAP_HEIGHT}"
-        map_params = {"ll": ll, "spn": spn, "l": self.map_type,
-                      "size": size, "apikey": STATIC_MAPS_API_KEY}
+        # Привязка вида к сетке тайлов: одинаковые виды дают одинаковые запросы
+        viewport = TileViewport.from_span(self.lon, self.lat, self.spn_lon, MAP_WIDTH, MAP_HEIGHT)
+        self.lon, self.lat, self.zoom = viewport.lon, viewport.lat, viewport.zoom
+        self.spn_lon, self.spn_lat = viewport.span()
+        self.viewport = viewport
+
+        # Предзагрузка для прошлого вида больше не нужна
+        self.prefetcher.cancel()
+
+        # Замер от запроса до показа кадра; незавершённый замер прошлого вида отбрасывается
+        self.view_span = metrics.start("map_view")
+
+        # Запрос выполняется в фоне, устаревшие ответы отбрасываются загрузчиком.
+        # Метки рисуются поверх карты, поэтому сама карта всегда собирается из тайлов
+        self.map_loader.request_tiles(viewport, map_type=self.map_type, theme=self.current_theme)
+
+    def on_map_loaded(self, pixmap):
+        self.displayed_pixmap = pixmap
+        self.displayed_viewport = self.viewport
+        if self.reload_timer.isActive():
+            # Пользователь уже ушёл к другому виду: новая карта служит основой его предпросмотра,
+            # а предзагрузка вокруг покинутого вида не нужна
+            self.show_preview()
+            self.view_span.finish()
+            return
+        with self.view_span.stage("paint"):
+            self.update_overlays()
+        self.view_span.finish()
 
-        # Добавление темы и маркера при необходимости
-        if self.current_theme == "dark":
-            map_params["theme"] = "dark"
-        if self.marker_coords:
-            map_params["pt"] = f"{self.marker_coords[0]:.6f},{self.marker_coords[1]:.6f},pm2rdm"
+        # Следующим действием почти всегда будет одна из клавиш навигации
+        self.prefetcher.prefetch(self.viewport, MOVE_STEP_FACTOR,
+                                 map_type=self.map_type, theme=self.current_theme)
 
-        try:
-            # Запрос и отображение карты
-            response = requests.get(STATIC_MAPS_API_SERVER, params=map_params)
-            response.raise_for_status()
-            pixmap = QPixmap()
-            loaded = pixmap.loadFromData(response.content)
-            if loaded:
-                self.image_label.setPixmap(pixmap)
-            else:
-                print("Ошибка: Не удалось загрузить QPixmap.")
-                self.image_label.setText("Ошибка загрузки карты")
-                self.clear_search_state()
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка сети при запросе карты: {e}")
-            self.image_label.setText(f"Ошибка сети:\n{e}")
-            self.clear_search_state()
-        except Exception as e:
-            print(f"Непредвиденная ошибка при загрузке карты: {e}")
-            self.image_label.setText(f"Ошибка:\n{e}")
-            self.clear_search_state()
+    def update_overlays(self):
+        # Перерисовка слоёв поверх уже загруженной карты не требует запросов к серверу
+        if self.displayed_pixmap is None:
+            return
+        self.image_label.setPixmap(render_overlays(self.displayed_pixmap, self.displayed_viewport,
+                                                   self.overlay_layers))
+        self.update_route_label()
+
+    def update_route_label(self):
+        if not len(self.route_layer):
+            self.route_label.clear()
+            return
+        visible_km = self.route_layer.visible_length_km(MercatorProjection.from_viewport(self.displayed_viewport))
+        self.route_label.setText(f"Длина маршрута: {self.route_layer.length_km:.2f} км, "
+                                 f"в кадре: {visible_km:.2f} км")
+
+    def on_map_failed(self, message):
+        print(f"Ошибка при загрузке карты: {message}")
+        self.view_span.finish(error=True)
+        self.image_label.setText(message)
+        self.clear_search_state()
 
     def toggle_theme(self, state):
         self.current_theme = "dark" if state == Qt.CheckState.Checked.value else "light"
         print(f"Переключена тема: {self.current_theme}")
         self.load_map()
 
+    def toggle_offline(self, state):
+        set_offline_mode(state == Qt.CheckState.Checked.value)
+        print(f"Офлайн-режим: {'Включен' if is_offline_mode() else 'Выключен'}")
+        self.load_map()
+
+    def load_marker_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Файл с метками", "",
+                                              "Метки (*.csv *.geojson *.json);;Все файлы (*)")
+        if not path:
+            return
+        self.load_markers(path)
+
+    def load_markers(self, path):
+        try:
+            lons, lats = load_points(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ошибка при чтении меток из {path}: {e}")
+            return
+        self.marker_layer.set_points(lons, lats)
+        print(f"Загружено меток: {len(self.marker_layer)}")
+        self.update_overlays()
+
+    def load_route_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Файл с маршрутом", "",
+                                              "Маршруты (*.gpx *.geojson *.json);;Все файлы (*)")
+        if not path:
+            return
+        self.load_route(path)
+
+    def load_route(self, path):
+        try:
+            tracks = load_tracks(path)
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"Ошибка при чтении маршрута из {path}: {e}")
+            return
+        self.route_layer.clear()
+        for lons, lats in tracks:
+            self.route_layer.add_track(lons, lats)
+        print(f"Загружено линий: {len(self.route_layer)}, длина {self.route_layer.length_km:.2f} км")
+        self.update_overlays()
+
     def toggle_postal_code(self, state):
         self.include_postal_code = (state == Qt.CheckState.Checked.value)
         print(f"Отображение индекса: {'Включено' if self.include_postal_code else 'Выключено'}")
@@ -182,6 +313,7 @@ class MapViewerApp(QWidget):
 
     def clear_search_state(self):
         self.marker_coords = None
+        self.search_marker.coords = None
         self.current_full_address = ""
         self.current_postal_code = None
         self.current_search_type = "address"  # Default back to address display logic
@@ -192,7 +324,7 @@ class MapViewerApp(QWidget):
             print("Сброс результата поиска.")
             self.clear_search_state()
             self.search_input.clear()
-            self.load_map()
+            self.update_overlays()
         else:
             print("Нет активного результата поиска для сброса.")
 
@@ -225,8 +357,30 @@ class MapViewerApp(QWidget):
         print(f"Выполняется поиск адреса: '{search_query}'")
         # Clear previous state *before* starting search
         self.clear_search_state()
-        found_data = self.geocode(geocode_query=search_query)
+        self.start_lookup("search", search_query, self.yandex_client.submit(
+            self.yandex_client.client.geocode_cached(geocode_query=search_query, cache=self.geocode_cache)))
+
+    def start_lookup(self, kind, argument, future):
+        # Ответы на прежние клики и поиски больше не нужны
+        self.lookup_generation += 1
+        self.lookups.watch(future, (self.lookup_generation, kind, argument))
+
+    def on_lookup_finished(self, tag, result):
+        generation, kind, argument = tag
+        if generation != self.lookup_generation:
+            return
+        if kind == "search":
+            self.show_search_result(argument, result)
+        elif kind == "address":
+            self.show_click_address(result)
+        else:
+            self.show_click_organization(result)
 
+    def on_lookup_failed(self, tag, error):
+        print(f"   Ошибка запроса ({type(error).__name__}): {error}")
+        self.on_lookup_finished(tag, None)
+
+    def show_search_result(self, search_query, found_data):
         if found_data:
             self.update_map_view(found_data)
             self.set_search_result(found_data, "address")
@@ -236,101 +390,10 @@ class MapViewerApp(QWidget):
             self.address_display.setText(f"Адрес '{search_query}' не найден.")
             self.load_map()  # Reload map without marker
 
-    def geocode(self, geocode_query=None, coords=None):
-        if not geocode_query and not coords:
-            return None
-
-        geocoder_params = {"apikey": GEOCODER_API_KEY, "format": "json", "results": 1}
-        request_type = "address"
-
-        if geocode_query:
-            geocoder_params["geocode"] = geocode_query
-        elif coords:
-            geocoder_params["geocode"] = f"{coords[0]:.6f},{coords[1]:.6f}"
-            request_type = "reverse"
-
-        try:
-            print(f"   Запрос Геокодер ({request_type}): {geocoder_params['geocode']}")
-            response = requests.get(GEOCODER_API_SERVER, params=geocoder_params)
-            response.raise_for_status()
-            json_response = response.json()
-            feature_member = json_response["response"]["GeoObjectCollection"]["featureMember"]
-
-            if not feature_member:
-                print(f"   Геокодер: Объект не найден.")
-                return None
-
-            geo_object = feature_member[0]["GeoObject"]
-            point_str = geo_object["Point"]["pos"]
-            found_coords = tuple(map(float, point_str.split(" ")))
-            address_meta = geo_object["metaDataProperty"]["GeocoderMetaData"]
-            full_address = address_meta.get("text", "Адрес не найден")
-            postal_code = address_meta.get("Address", {}).get("postal_code")
-
-            print(f"   Геокодер вернул: {full_address}" + (f", {postal_code}" if postal_code else ""))
-
-            bounds = None
-            try:
-                envelope = geo_object["boundedBy"]["Envelope"]
-                lc_coords = tuple(map(float, envelope["lowerCorner"].split(" ")))
-                uc_coords = tuple(map(float, envelope["upperCorner"].split(" ")))
-                bounds = (lc_coords, uc_coords)
-            except (KeyError, IndexError, ValueError):
-                pass
-
-            return {"coords": found_coords, "address": full_address,
-                    "postal_code": postal_code, "bounds": bounds}
-        except requests.exceptions.RequestException as e:
-            print(f"   Ошибка сети Геокодер: {e}")
-            return None
-        except Exception as e:
-            print(f"   Ошибка Геокодер: {e}")
-            return None
-
     def find_nearby_organization(self, coords_lonlat):
-        """Finds the nearest org within radius using Geosearch API."""
-        search_params = {
-            "apikey": GEOSEARCH_API_KEY,
-            "lang": "ru_RU",
-            "ll": f"{coords_lonlat[0]},{coords_lonlat[1]}",
-            "type": "biz",
-            "results": 1,
-            "text": "организация",
-            "spn": "0.005,0.005",
-            # Удалены параметры spn и rspn, которые ограничивали поиск
-        }
-
-        print(f"   Запрос Geosearch около: {coords_lonlat}")
-
+        """Finds the nearest org within radius using the local organization store."""
         try:
-            response = requests.get(GEOSEARCH_API_SERVER, params=search_params)
-            response.raise_for_status()
-            json_response = response.json()
-            features = json_response.get("features")
-
-            if not features:
-                print("   Geosearch: Организации не найдены.")
-                return None
-
-            organization = features[0]
-            org_meta = organization["properties"].get("CompanyMetaData", {})
-            org_name = org_meta.get("name", "Без имени")
-            org_address = org_meta.get("address", "Без адреса")
-            point = organization["geometry"]["coordinates"]
-            org_coords = (float(point[0]), float(point[1]))
-
-            print(f"   Найдена организация: {org_name} в {org_coords}")
-
-            # Check distance
-            distance = haversine_distance(coords_lonlat, org_coords) * 1000  # meters
-            print(f"   Расстояние до организации: {distance:.1f} м")
-
-            if distance <= ORGANIZATION_SEARCH_RADIUS_M:
-                return {"coords": org_coords, "name": org_name, "address": org_address}
-            else:
-                print("   Организация слишком далеко (> 50м).")
-                return None
-
+            organization, distance = self.org_store.find_nearest(coords_lonlat, ORGANIZATION_SEARCH_RADIUS_M)
         except requests.exceptions.RequestException as e:
             print(f"   Ошибка сети Geosearch: {e}")
             return None
@@ -338,6 +401,14 @@ class MapViewerApp(QWidget):
             print(f"   Ошибка Geosearch ({type(e).__name__}): {e}")
             return None
 
+        if organization is None:
+            print(f"   Организаций в радиусе {ORGANIZATION_SEARCH_RADIUS_M} м не найдено.")
+            return None
+
+        print(f"   Найдена организация: {organization['name']} в {organization['coords']}")
+        print(f"   Расстояние до организации: {distance:.1f} м")
+        return organization
+
     def update_map_view(self, geo_data):
         if not geo_data or "coords" not in geo_data:
             return
@@ -359,6 +430,7 @@ class MapViewerApp(QWidget):
             return
 
         self.marker_coords = data["coords"]
+        self.search_marker.coords = self.marker_coords
         self.current_search_type = result_type
 
         if result_type == "address":
@@ -423,7 +495,7 @@ class MapViewerApp(QWidget):
                 print("Достигнута восточная граница карты")
 
         if map_updated:
-            self.load_map()
+            self.schedule_map_reload()
         else:
             super().keyPressEvent(event)
 
@@ -440,65 +512,40 @@ class MapViewerApp(QWidget):
 
             if event.button() == Qt.MouseButton.LeftButton:
                 print("Левый клик - поиск адреса.")
-                found_data = self.geocode(coords=geo_coords)
-                if found_data:
-                    self.clear_search_state()
-                    self.set_search_result(found_data, "address")
-                else:
-                    self.clear_search_state()
-                    self.address_display.setText("Адрес не найден по координатам.")
-                self.load_map()
+                self.start_lookup("address", geo_coords, self.yandex_client.submit(
+                    self.yandex_client.client.geocode_cached(coords=geo_coords, cache=self.geocode_cache)))
 
             elif event.button() == Qt.MouseButton.RightButton:
                 print("Правый клик - поиск организации.")
-                # Правильный вызов метода с переданными координатами
-                found_org = self.find_nearby_organization(geo_coords)
-
-                if found_org:
-                    self.clear_search_state()
-                    self.set_search_result(found_org, "organization")
-                else:
-                    self.clear_search_state()
-                    self.address_display.setText("Организаций в радиусе 50м не найдено.")
-                self.load_map()
+                self.start_lookup("organization", geo_coords,
+                                  self.yandex_client.run_blocking(self.find_nearby_organization, geo_coords))
         else:
             super().mousePressEvent(event)
 
+    def show_click_address(self, found_data):
+        self.clear_search_state()
+        if found_data:
+            self.set_search_result(found_data, "address")
+        else:
+            self.address_display.setText("Адрес не найден по координатам.")
+        self.update_overlays()
+
+    def show_click_organization(self, found_org):
+        self.clear_search_state()
+        if found_org:
+            self.set_search_result(found_org, "organization")
+        else:
+            self.address_display.setText("Организаций в радиусе 50м не найдено.")
+        self.update_overlays()
+
+    def current_projection(self):
+        # Клик относится к окну, собранному из тайлов (или к его превью)
+        return MercatorProjection.from_viewport(self.viewport)
+
     def screen_to_geo(self, screen_pos: QPoint):
         try:
-            x_pix, y_pix = screen_pos.x(), screen_pos.y()
-            center_lon, center_lat = self.lon, self.lat
-            span_lon, span_lat = self.spn_lon, self.spn_lat
-            map_width, map_height = MAP_WIDTH, MAP_HEIGHT
-
-            lon_per_pixel = span_lon / map_width
-            clicked_lon = center_lon + (x_pix - map_width / 2.0) * lon_per_pixel
-
-            def lat_to_merc_y(lat_d):
-                lat_r = math.radians(max(MIN_LAT, min(lat_d, MAX_LAT)))
-                sin_lat = math.sin(lat_r)
-                if abs(sin_lat) > 0.999999:
-                    sin_lat = math.copysign(0.999999, sin_lat)
-                y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
-                return y
-
-            def merc_y_to_lat(y_norm):
-                g = math.pi * (1 - 2 * y_norm)
-                lat_d = math.degrees(2 * math.atan(math.exp(g)) - math.pi / 2)
-                return lat_d
-
-            lat_top = center_lat + span_lat / 2.0
-            lat_bottom = center_lat - span_lat / 2.0
-            merc_y_top = lat_to_merc_y(lat_top)
-            merc_y_bottom = lat_to_merc_y(lat_bottom)
-            pixel_y_fraction = y_pix / map_height
-            clicked_merc_y = merc_y_top + pixel_y_fraction * (merc_y_bottom - merc_y_top)
-            clicked_lat = merc_y_to_lat(clicked_merc_y)
-
-            clicked_lon = max(MIN_LON, min(clicked_lon, MAX_LON))
-            clicked_lat = max(MIN_LAT, min(clicked_lat, MAX_LAT))
-
-            return clicked_lon, clicked_lat
+            clicked_lon, clicked_lat = self.current_projection().screen_to_geo(screen_pos.x(), screen_pos.y())
+            return float(clicked_lon), float(clicked_lat)
         except Exception as e:
             print(f"Ошибка при конвертации координат: {e}")
             return None
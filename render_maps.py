@@ -0,0 +1,124 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from utils.disk_cache import DiskMapCache
+from utils.map_cache import MapCache
+from utils.map_utils import build_static_map_params
+from utils.rate_limit import TokenBucket
+from utils.static_maps import MapResponseError, fetch_map_data
+
+DEFAULT_SPN = 0.05
+
+
+def parse_markers(value):
+    """Accepts a list of [lon, lat] pairs or a "lon,lat;lon,lat" string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [tuple(map(float, point.split(","))) for point in value.split(";") if point.strip()]
+    return [tuple(map(float, point)) for point in value]
+
+
+def read_views(path):
+    """Reads view descriptions from a .csv or .jsonl file."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def view_to_params(view, size):
+    """Builds Static Maps API parameters from one input row, like MapViewerApp.load_map does."""
+    lon, lat = float(view["lon"]), float(view["lat"])
+    zoom = view.get("zoom") or view.get("z")
+    spn_lon = float(view.get("spn_lon") or DEFAULT_SPN)
+    spn_lat = float(view.get("spn_lat") or spn_lon)
+    return build_static_map_params(lon, lat, spn_lon, spn_lat,
+                                   map_type=view.get("map_type") or "map",
+                                   size=size,
+                                   theme=view.get("theme") or "light",
+                                   zoom=int(zoom) if zoom not in (None, "") else None,
+                                   markers=parse_markers(view.get("markers")))
+
+
+def render_view(index, view, args, cache, disk_cache, rate_limiter):
+    name = view.get("name") or f"map_{index:05d}"
+    map_params = view_to_params(view, args.size)
+    data, source = fetch_map_data(map_params, cache, disk_cache, rate_limiter)
+
+    path = os.path.join(args.output_dir, f"{name}.png")
+    with open(path, "wb") as f:
+        f.write(data)
+    return name, source, len(data)
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная отрисовка статических карт без графического интерфейса.")
+    parser.add_argument("views", help="CSV или JSONL с полями name, lon, lat, spn_lon, spn_lat, zoom, "
+                                      "theme, map_type, markers")
+    parser.add_argument("-o", "--output-dir", default="maps_out", help="каталог для PNG-файлов")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="число параллельных запросов")
+    parser.add_argument("-r", "--rate", type=float, default=5.0, help="не более N запросов к API в секунду")
+    parser.add_argument("--size", type=parse_size, default=(600, 450), help="размер изображения, например 600x450")
+    parser.add_argument("--no-disk-cache", action="store_true", help="не использовать дисковый кэш карт")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache = MapCache()
+    disk_cache = None if args.no_disk_cache else DiskMapCache()
+    rate_limiter = TokenBucket(args.rate)
+
+    views = list(read_views(args.views))
+    total = len(views)
+    done = errors = total_bytes = 0
+    sources = {"memory": 0, "pack": 0, "disk": 0, "stale": 0, "network": 0}
+    lock = threading.Lock()
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(render_view, index, view, args, cache, disk_cache, rate_limiter): index
+                   for index, view in enumerate(views)}
+        for future in as_completed(futures):
+            with lock:
+                done += 1
+                try:
+                    name, source, size = future.result()
+                    sources[source] += 1
+                    total_bytes += size
+                    print(f"[{done}/{total}] {name}.png ({source}, {size} байт)")
+                except (requests.exceptions.RequestException, MapResponseError, OSError,
+                        KeyError, ValueError) as e:
+                    errors += 1
+                    print(f"[{done}/{total}] Ошибка для вида #{futures[future]}: {e}")
+
+    if disk_cache is not None:
+        disk_cache.save_index()
+
+    elapsed = time.monotonic() - started
+    print(f"Готово: {total - errors} из {total} карт за {elapsed:.1f} с "
+          f"({(total - errors) / elapsed if elapsed else 0:.1f} карт/с, "
+          f"{total_bytes / 1024 / elapsed if elapsed else 0:.1f} КБ/с), ошибок: {errors}")
+    print(f"Источники: сеть {sources['network']}, диск {sources['disk']}, "
+          f"устаревшие с диска {sources['stale']}, пакет региона {sources['pack']}, память {sources['memory']}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import argparse
+import math
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from geocode_batch import read_queries
+from utils.config import OFFLINE_PACK_PATH
+from utils.geocoder import geocode_request
+from utils.rate_limit import TokenBucket
+from utils.region_pack import RegionPack
+from utils.static_maps import MapResponseError, fetch_map_data
+from utils.tile_store import tile_style
+from utils.tiles import MAX_ZOOM, MIN_ZOOM, TILE_SIZE, lonlat_to_world, tile_map_params
+
+BATCH_SIZE = 500
+
+
+def parse_bbox(value):
+    min_lon, min_lat, max_lon, max_lat = map(float, value.split(","))
+    return min(min_lon, max_lon), min(min_lat, max_lat), max(min_lon, max_lon), max(min_lat, max_lat)
+
+
+def tile_range(bbox, zoom):
+    """Returns (first_x, last_x, first_y, last_y) of tiles covering bbox at zoom."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    last_tile = 2 ** zoom - 1
+    left, top = lonlat_to_world(min_lon, max_lat, zoom)
+    right, bottom = lonlat_to_world(max_lon, min_lat, zoom)
+    return (max(0, math.floor(left / TILE_SIZE)), min(last_tile, math.floor(right / TILE_SIZE)),
+            max(0, math.floor(top / TILE_SIZE)), min(last_tile, math.floor(bottom / TILE_SIZE)))
+
+
+def iter_missing_tiles(pack, bbox, zooms):
+    """Streams (zoom, tile_x, tile_y) of the bbox that are not in the pack yet."""
+    for zoom in zooms:
+        existing = pack.existing_tiles(zoom, pack.style)
+        first_x, last_x, first_y, last_y = tile_range(bbox, zoom)
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                if (tile_x, tile_y) not in existing:
+                    yield zoom, tile_x, tile_y
+
+
+def download_tile(zoom, tile_x, tile_y, map_type, theme, rate_limiter):
+    map_params = tile_map_params(zoom, tile_x, tile_y, map_type=map_type, theme=theme)
+    data, _ = fetch_map_data(map_params, rate_limiter=rate_limiter)
+    return zoom, tile_x, tile_y, data
+
+
+def run_bounded(executor, items, submit, on_result, max_pending):
+    """Runs submit(item) for a stream of items, keeping at most max_pending futures in flight."""
+    pending = {}
+
+    def collect(futures):
+        for future in futures:
+            on_result(pending.pop(future), future)
+
+    for item in items:
+        pending[submit(item)] = item
+        if len(pending) >= max_pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    while pending:
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        collect(finished)
+
+
+def seed_tiles(pack, args, executor, rate_limiter):
+    zooms = range(args.min_zoom, args.max_zoom + 1)
+    total = 0
+    for zoom in zooms:
+        first_x, last_x, first_y, last_y = tile_range(args.bbox, zoom)
+        total += (last_x - first_x + 1) * (last_y - first_y + 1)
+
+    counters = {"saved": 0, "errors": 0}
+    batch = []
+    started = time.monotonic()
+
+    def on_result(tile, future):
+        try:
+            batch.append(future.result())
+        except (requests.exceptions.RequestException, MapResponseError) as e:
+            counters["errors"] += 1
+            print(f"Ошибка для тайла {tile[0]}/{tile[1]}/{tile[2]}: {e}")
+            return
+        # Запись идёт только из этого потока и крупными транзакциями
+        if len(batch) >= BATCH_SIZE:
+            pack.put_tiles(batch)
+            counters["saved"] += len(batch)
+            batch.clear()
+            elapsed = time.monotonic() - started
+            print(f"Сохранено {counters['saved']} тайлов ({counters['saved'] / elapsed:.1f} в секунду)")
+
+    try:
+        run_bounded(executor, iter_missing_tiles(pack, args.bbox, zooms),
+                    lambda tile: executor.submit(download_tile, *tile, args.map_type, args.theme, rate_limiter),
+                    on_result, args.workers * 4)
+    finally:
+        if batch:
+            pack.put_tiles(batch)
+            counters["saved"] += len(batch)
+
+    print(f"Тайлы: всего в области {total}, загружено {counters['saved']}, ошибок {counters['errors']}")
+    return counters["errors"]
+
+
+def seed_geocodes(pack, args, executor, rate_limiter):
+    counters = {"saved": 0, "not_found": 0, "errors": 0}
+    batch = []
+
+    def geocode_one(query):
+        rate_limiter.acquire()
+        return geocode_request(geocode_query=query)
+
+    def on_result(query, future):
+        try:
+            result = future.result()
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            counters["errors"] += 1
+            print(f"Ошибка для '{query}': {e}")
+            return
+        if result is None:
+            counters["not_found"] += 1
+            return
+        batch.append((query, None, result))
+        if len(batch) >= BATCH_SIZE:
+            pack.put_geocodes(batch)
+            counters["saved"] += len(batch)
+            batch.clear()
+
+    try:
+        run_bounded(executor, read_queries(args.addresses, args.column),
+                    lambda query: executor.submit(geocode_one, query), on_result, args.workers * 4)
+    finally:
+        if batch:
+            pack.put_geocodes(batch)
+            counters["saved"] += len(batch)
+
+    print(f"Адреса: сохранено {counters['saved']}, не найдено {counters['not_found']}, "
+          f"ошибок {counters['errors']}")
+    return counters["errors"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Загрузка пакета региона для офлайн-режима.")
+    parser.add_argument("bbox", type=parse_bbox, help="область: min_lon,min_lat,max_lon,max_lat")
+    parser.add_argument("--min-zoom", type=int, default=10, help="минимальный масштаб")
+    parser.add_argument("--max-zoom", type=int, default=15, help="максимальный масштаб")
+    parser.add_argument("--map-type", default="map", help="слой карты (map, sat, ...)")
+    parser.add_argument("--theme", choices=("light", "dark"), default="light", help="тема карты")
+    parser.add_argument("-p", "--pack", default=OFFLINE_PACK_PATH, help="файл пакета региона (MBTiles)")
+    parser.add_argument("-a", "--addresses", help="адреса для снимка геокодера (текстовый файл или CSV)")
+    parser.add_argument("-c", "--column", help="имя столбца с адресом во входном CSV")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="число параллельных запросов")
+    parser.add_argument("-r", "--rate", type=float, default=10.0, help="не более N запросов к API в секунду")
+    args = parser.parse_args(argv)
+
+    if not MIN_ZOOM <= args.min_zoom <= args.max_zoom <= MAX_ZOOM:
+        parser.error(f"масштабы должны удовлетворять {MIN_ZOOM} <= min-zoom <= max-zoom <= {MAX_ZOOM}")
+
+    pack = RegionPack(args.pack)
+    style = tile_style(args.map_type, args.theme)
+    stored_style = pack.get_metadata("style")
+    if stored_style is not None and stored_style != style:
+        parser.error(f"пакет уже содержит тайлы стиля {stored_style}")
+
+    min_zoom = min(args.min_zoom, int(pack.get_metadata("minzoom") or args.min_zoom))
+    max_zoom = max(args.max_zoom, int(pack.get_metadata("maxzoom") or args.max_zoom))
+    pack.set_metadata({"name": pack.get_metadata("name") or "map_viewer region",
+                       "format": "png" if args.map_type == "map" else "jpg",
+                       "type": "baselayer", "style": style,
+                       "minzoom": min_zoom, "maxzoom": max_zoom,
+                       "bounds": ",".join(f"{value:.6f}" for value in args.bbox)})
+
+    rate_limiter = TokenBucket(args.rate)
+    started = time.monotonic()
+    errors = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        try:
+            errors += seed_tiles(pack, args, executor, rate_limiter)
+            if args.addresses:
+                errors += seed_geocodes(pack, args, executor, rate_limiter)
+        except KeyboardInterrupt:
+            print("Прервано. Запустите команду снова, чтобы догрузить недостающее.")
+            executor.shutdown(cancel_futures=True)
+            errors += 1
+    pack.close()
+
+    print(f"Готово за {time.monotonic() - started:.1f} с, пакет: {args.pack}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,433 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import requests
+
+ENDPOINTS = ("geocoder", "geosearch", "static_maps")
+# Пути заглушки; полные адреса подставляются в MAP_VIEWER_*_SERVER
+ENDPOINT_PATHS = {"geocoder": "/geocoder/1.x/", "geosearch": "/geosearch/v1/", "static_maps": "/static/v1"}
+ENV_VARIABLES = {"geocoder": "MAP_VIEWER_GEOCODER_SERVER", "geosearch": "MAP_VIEWER_GEOSEARCH_SERVER",
+                 "static_maps": "MAP_VIEWER_STATIC_MAPS_SERVER"}
+# Настоящие серверы, к которым обращается режим записи
+UPSTREAM_SERVERS = {"geocoder": "http://geocode-maps.yandex.ru/1.x/",
+                    "geosearch": "https://search-maps.yandex.ru/v1/",
+                    "static_maps": "https://static-maps.yandex.ru/v1"}
+FIXTURE_TYPES = {".json": "application/json; charset=utf-8", ".png": "image/png", ".jpg": "image/jpeg"}
+
+WRITE_CHUNK_SIZE = 4096
+SYNTHETIC_CENTER = (37.617635, 55.755814)  # синтетические объекты разбрасываются вокруг Москвы
+SYNTHETIC_SPREAD = 0.3
+NOISE_BLOCK = 4
+ORG_CELL_DEG = 0.001  # сетка синтетических организаций
+ORG_MAX_PER_CELL = 4  # в среднем две организации на ячейку
+ORG_MAX_SPAN_DEG = 0.05
+
+
+def encode_png(pixels):
+    """Encodes an (height, width, 3) uint8 array as PNG using only zlib."""
+    height, width, _ = pixels.shape
+    # Каждая строка начинается с байта фильтра (0 — без фильтра)
+    raw = np.concatenate((np.zeros((height, 1), dtype=np.uint8), pixels.reshape(height, width * 3)), axis=1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+@lru_cache(maxsize=512)
+def synthetic_map(width, height, seed, dark, noise):
+    """
+    Synthetic map image: a background with a street grid and pixel noise.
+
+    The colors depend on seed, so neighbouring tiles differ; noise brings the
+    PNG size closer to that of real map images.
+    """
+    rng = np.random.default_rng(seed)
+    base = np.array((48, 52, 60) if dark else (236, 232, 222), dtype=np.int16) + rng.integers(-12, 13, 3)
+    pixels = np.empty((height, width, 3), dtype=np.int16)
+    pixels[:] = base
+    line = np.array((90, 96, 110) if dark else (255, 255, 255), dtype=np.int16)
+    step = int(rng.integers(24, 64))
+    offset_x, offset_y = rng.integers(0, step, 2)
+    pixels[offset_y::step, :] = line
+    pixels[:, offset_x::step] = line
+    if noise:
+        # Шум блоками по NOISE_BLOCK пикселей сжимается примерно как настоящие карты
+        blocks = rng.integers(-noise, noise + 1, (height, -(-width // NOISE_BLOCK), 1), dtype=np.int16)
+        pixels += blocks.repeat(NOISE_BLOCK, axis=1)[:, :width]
+    return encode_png(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def stable_seed(*parts):
+    digest = hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def parse_pair(value, default):
+    try:
+        first, second = map(float, value.split(",")[:2])
+        return first, second
+    except (AttributeError, ValueError):
+        return default
+
+
+def synthetic_geocoder(params):
+    """Geocoder API response for a forward (address) or reverse ("lon,lat") request."""
+    query = params.get("geocode", "").strip()
+    if not query:
+        return {"response": {"GeoObjectCollection": {"featureMember": []}}}
+
+    coords = parse_pair(query, None)
+    if coords is not None:
+        lon, lat = coords
+        address = f"Синтетический адрес {lon:.5f}, {lat:.5f}"
+    else:
+        rng = random.Random(stable_seed("geocoder", query))
+        lon = SYNTHETIC_CENTER[0] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD)
+        lat = SYNTHETIC_CENTER[1] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD)
+        address = query
+    postal_code = str(100000 + stable_seed("postal", round(lon, 2), round(lat, 2)) % 900000)
+    geo_object = {
+        "Point": {"pos": f"{lon:.6f} {lat:.6f}"},
+        "boundedBy": {"Envelope": {"lowerCorner": f"{lon - 0.005:.6f} {lat - 0.003:.6f}",
+                                   "upperCorner": f"{lon + 0.005:.6f} {lat + 0.003:.6f}"}},
+        "metaDataProperty": {"GeocoderMetaData": {"text": address, "Address": {"postal_code": postal_code}}},
+    }
+    return {"response": {"GeoObjectCollection": {"featureMember": [{"GeoObject": geo_object}]}}}
+
+
+def cell_organizations(cell_x, cell_y):
+    """Organizations of one grid cell: (lon, lat, name), the same for every request."""
+    rng = random.Random(stable_seed("organizations", cell_x, cell_y))
+    return [((cell_x + rng.random()) * ORG_CELL_DEG, (cell_y + rng.random()) * ORG_CELL_DEG,
+             f"Организация {cell_x}:{cell_y}:{number + 1}")
+            for number in range(rng.randint(0, ORG_MAX_PER_CELL))]
+
+
+def synthetic_geosearch(params):
+    """
+    Geosearch API response for the organizations inside the requested span.
+
+    Organizations are placed on a fixed grid, so overlapping requests see the
+    same objects. Like the real API, a full response is cut to "results"
+    items in an order unrelated to the distance from the center.
+    """
+    lon, lat = parse_pair(params.get("ll"), SYNTHETIC_CENTER)
+    spn_lon, spn_lat = parse_pair(params.get("spn"), (0.01, 0.01))
+    try:
+        results = max(0, min(int(params.get("results", 10)), 500))
+    except ValueError:
+        results = 10
+
+    # Для огромных областей перебираются только ячейки вокруг центра — ответ всё равно обрезан
+    half_lon = min(spn_lon, ORG_MAX_SPAN_DEG) / 2
+    half_lat = min(spn_lat, ORG_MAX_SPAN_DEG) / 2
+    min_lon, max_lon, min_lat, max_lat = lon - half_lon, lon + half_lon, lat - half_lat, lat + half_lat
+    found = [org for cell_x in range(math.floor(min_lon / ORG_CELL_DEG), math.floor(max_lon / ORG_CELL_DEG) + 1)
+             for cell_y in range(math.floor(min_lat / ORG_CELL_DEG), math.floor(max_lat / ORG_CELL_DEG) + 1)
+             for org in cell_organizations(cell_x, cell_y)
+             if min_lon <= org[0] <= max_lon and min_lat <= org[1] <= max_lat]
+    found.sort(key=lambda org: stable_seed("relevance", org[2]))
+
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [org_lon, org_lat]},
+        "properties": {"CompanyMetaData": {"name": name,
+                                           "address": f"Синтетический адрес {org_lon:.5f}, {org_lat:.5f}"}},
+    } for org_lon, org_lat, name in found[:results]]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def synthetic_static_map(params, noise):
+    width, height = (int(value) for value in parse_pair(params.get("size"), (600, 450)))
+    width, height = max(1, min(width, 650)), max(1, min(height, 450))
+    seed = stable_seed("static", params.get("ll"), params.get("z"), params.get("spn"), params.get("l"))
+    return synthetic_map(width, height, seed, params.get("theme") == "dark", noise)
+
+
+class Profile:
+    """Simulated network conditions of one endpoint."""
+
+    def __init__(self, latency=0.0, jitter=0.0, bandwidth=0.0, error_rate=0.0):
+        self.latency = latency  # секунд до заголовков ответа
+        self.jitter = jitter  # секунд, равномерно в обе стороны
+        self.bandwidth = bandwidth  # байт в секунду, 0 — без ограничения
+        self.error_rate = error_rate
+
+
+class FixtureStore:
+    """
+    Recorded responses, one file per request.
+
+    Files live in <directory>/<endpoint>/<key><ext>, where the key is a hash
+    of the query parameters without the API key and the extension gives the
+    content type.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def key(params):
+        query = "&".join(f"{name}={value}" for name, value in sorted(params.items()) if name != "apikey")
+        return hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+    def get(self, endpoint, params):
+        """Returns (body, content_type) or None."""
+        base = os.path.join(self.directory, endpoint, self.key(params))
+        for extension, content_type in FIXTURE_TYPES.items():
+            try:
+                with open(base + extension, "rb") as f:
+                    return f.read(), content_type
+            except FileNotFoundError:
+                continue
+        return None
+
+    def put(self, endpoint, params, body, content_type):
+        extension = next((ext for ext, known in FIXTURE_TYPES.items()
+                          if known.split(";")[0] == content_type.split(";")[0].strip()), None)
+        if extension is None:
+            return
+        os.makedirs(os.path.join(self.directory, endpoint), exist_ok=True)
+        path = os.path.join(self.directory, endpoint, self.key(params) + extension)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Geocoder, Geosearch and Static Maps APIs.
+
+    Responses come from recorded fixtures when available (optionally
+    recording misses from the real servers) and are synthesized otherwise.
+    Synthetic responses depend only on the request, so runs are
+    reproducible. Every endpoint has a Profile with latency, jitter, a
+    bandwidth cap and an error rate.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, profiles, fixtures=None, record=False, error_status=503, noise=8,
+                 seed=0, verbose=False):
+        super().__init__(address, StubRequestHandler)
+        self.profiles = profiles
+        self.fixtures = fixtures
+        self.record = record
+        self.error_status = error_status
+        self.noise = noise
+        self.verbose = verbose
+        self.counters = {endpoint: {"requests": 0, "errors": 0, "fixtures": 0, "bytes": 0} for endpoint in ENDPOINTS}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def endpoint_urls(self):
+        return {endpoint: self.base_url + path for endpoint, path in ENDPOINT_PATHS.items()}
+
+    def draw(self, profile):
+        """Returns (delay, fail) for one request."""
+        with self._lock:
+            delay = max(0.0, profile.latency + self._random.uniform(-profile.jitter, profile.jitter))
+            return delay, self._random.random() < profile.error_rate
+
+    def count(self, endpoint, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.counters[endpoint][name] += value
+
+    def respond(self, endpoint, params):
+        """Returns (status, body, content_type, from_fixture)."""
+        if self.fixtures is not None:
+            recorded = self.fixtures.get(endpoint, params)
+            if recorded is not None:
+                return 200, *recorded, True
+            if self.record:
+                response = requests.get(UPSTREAM_SERVERS[endpoint], params=params, timeout=(5, 30))
+                content_type = response.headers.get("Content-Type", "application/octet-stream")
+                if response.status_code == 200:
+                    self.fixtures.put(endpoint, params, response.content, content_type)
+                return response.status_code, response.content, content_type, False
+
+        if endpoint == "static_maps":
+            return 200, synthetic_static_map(params, self.noise), "image/png", False
+        body = synthetic_geocoder(params) if endpoint == "geocoder" else synthetic_geosearch(params)
+        return 200, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", False
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих серверов
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = next((name for name, path in ENDPOINT_PATHS.items()
+                         if url.path.rstrip("/") == path.rstrip("/")), None)
+        if endpoint is None:
+            self.send_body(404, json.dumps({"message": "Not found"}).encode("utf-8"), "application/json")
+            return
+
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        profile = self.server.profiles[endpoint]
+        delay, fail = self.server.draw(profile)
+        time.sleep(delay)
+
+        if fail:
+            status = self.server.error_status
+            body, content_type = json.dumps({"message": "Simulated error"}).encode("utf-8"), "application/json"
+            from_fixture = False
+        else:
+            try:
+                status, body, content_type, from_fixture = self.server.respond(endpoint, params)
+            except requests.exceptions.RequestException as e:
+                status, body, content_type, from_fixture = 502, str(e).encode("utf-8"), "text/plain", False
+        self.server.count(endpoint, requests=1, errors=int(status != 200), fixtures=int(from_fixture),
+                          bytes=len(body))
+        self.send_body(status, body, content_type, profile.bandwidth)
+
+    def send_body(self, status, body, content_type, bandwidth=0.0):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            if not bandwidth:
+                self.wfile.write(body)
+                return
+            # Ограничение пропускной способности: частями с паузами
+            started = time.monotonic()
+            for sent in range(0, len(body), WRITE_CHUNK_SIZE):
+                chunk = body[sent:sent + WRITE_CHUNK_SIZE]
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                pause = started + (sent + len(chunk)) / bandwidth - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_stub_server(host="127.0.0.1", port=0, profiles=None, **options):
+    """
+    Starts a StubServer in a background thread (for benchmarks and scripts).
+
+    Returns:
+        StubServer: Running server; endpoint_urls() gives the addresses, shutdown() stops it.
+    """
+    profiles = profiles or {endpoint: Profile() for endpoint in ENDPOINTS}
+    server = StubServer((host, port), profiles, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_per_endpoint(value, scale=1.0):
+    """
+    Parses an option value: either one number for all endpoints or
+    "endpoint=number" pairs separated by commas.
+
+    Returns:
+        dict: {endpoint: number}, only for the endpoints given.
+    """
+    if "=" not in value:
+        return {endpoint: float(value) * scale for endpoint in ENDPOINTS}
+    result = {}
+    for item in value.split(","):
+        endpoint, _, number = item.partition("=")
+        endpoint = endpoint.strip()
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"неизвестный сервис {endpoint!r}, ожидается один из {ENDPOINTS}")
+        result[endpoint] = float(number) * scale
+    return result
+
+
+def milliseconds(value):
+    return parse_per_endpoint(value, 0.001)
+
+
+def kilobytes_per_second(value):
+    return parse_per_endpoint(value, 1024)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Локальная заглушка Геокодера, Geosearch и Static Maps API для воспроизводимых замеров.",
+        epilog="Параметры --latency, --jitter, --bandwidth и --error-rate принимают одно число для всех сервисов "
+               "или пары вида geocoder=30,static_maps=120.")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес для входящих соединений")
+    parser.add_argument("-p", "--port", type=int, default=8010, help="порт (0 — любой свободный)")
+    parser.add_argument("-f", "--fixtures", help="каталог записанных ответов; без него ответы синтетические")
+    parser.add_argument("--record", action="store_true",
+                        help="запрашивать отсутствующие ответы у настоящих серверов и сохранять в --fixtures")
+    parser.add_argument("--latency", type=milliseconds, default={},
+                        help="задержка до ответа, мс")
+    parser.add_argument("--jitter", type=milliseconds, default={},
+                        help="случайный разброс задержки (±), мс")
+    parser.add_argument("--bandwidth", type=kilobytes_per_second, default={},
+                        help="пропускная способность на соединение, КБ/с (0 — без ограничения)")
+    parser.add_argument("--error-rate", type=parse_per_endpoint, default={}, help="доля ответов с ошибкой, 0..1")
+    parser.add_argument("--error-status", type=int, default=503,
+                        help="HTTP-код ошибки (500–504 клиент повторяет, 429 и 403 — нет)")
+    parser.add_argument("--noise", type=int, default=8,
+                        help="шум на синтетических картах, 0–127; больше шума — крупнее PNG")
+    parser.add_argument("--seed", type=int, default=0, help="зерно случайных задержек и ошибок")
+    parser.add_argument("-v", "--verbose", action="store_true", help="печатать каждый запрос")
+    args = parser.parse_args(argv)
+
+    if args.record and not args.fixtures:
+        parser.error("для --record нужен --fixtures")
+
+    profiles = {endpoint: Profile(latency=args.latency.get(endpoint, 0.0), jitter=args.jitter.get(endpoint, 0.0),
+                                  bandwidth=args.bandwidth.get(endpoint, 0.0),
+                                  error_rate=args.error_rate.get(endpoint, 0.0))
+                for endpoint in ENDPOINTS}
+    fixtures = FixtureStore(args.fixtures) if args.fixtures else None
+    try:
+        server = StubServer((args.host, args.port), profiles, fixtures=fixtures, record=args.record,
+                            error_status=args.error_status, noise=max(0, min(args.noise, 127)),
+                            seed=args.seed, verbose=args.verbose)
+    except OSError as e:
+        print(f"Не удалось открыть порт {args.port}: {e}")
+        return 1
+
+    print(f"Заглушка API запущена на {server.base_url}. Для просмотрщика задайте:")
+    for endpoint, url in server.endpoint_urls().items():
+        print(f"  export {ENV_VARIABLES[endpoint]}={url}")
+    print("  export MAP_VIEWER_CACHE_DIR=<отдельный каталог>  # чтобы синтетические ответы не попали в обычный кэш")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    for endpoint, counters in server.counters.items():
+        print(f"{endpoint}: запросов {counters['requests']}, ошибок {counters['errors']}, "
+              f"из записей {counters['fixtures']}, отдано {counters['bytes'] / 1024:.0f} КБ")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
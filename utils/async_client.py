@@ -0,0 +1,226 @@
+import asyncio
+import functools
+import threading
+
+import aiohttp
+
+from utils.config import (GEOCODER_API_SERVER, GEOSEARCH_API_SERVER, STATIC_MAPS_API_SERVER,
+                          HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+                          HTTP_RETRIES, HTTP_BACKOFF_FACTOR, ORG_BATCH_SPN, ORG_BATCH_RESULTS)
+from utils.geocoder import (geocoder_flight_key, geocoder_params_for, lookup_geocode, parse_geocoder_response,
+                            report_geocode_result, store_geocode_result)
+from utils.map_cache import make_map_cache_key
+from utils.metrics import metrics
+from utils.org_store import parse_organization, search_params_for
+from utils.static_maps import MapResponseError, lookup_map_data, store_map_data
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class AsyncYandexClient:
+    """
+    Asyncio client for the Geocoder, Geosearch and Static Maps APIs.
+
+    All requests share one aiohttp connection pool, so many coroutines can
+    run concurrently over kept-alive connections. Use as an async context
+    manager or call close() when done.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 read_timeout=HTTP_READ_TIMEOUT, retries=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR,
+                 rate_limiter=None):
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter
+        self._session = None
+        # Одинаковые запросы, запущенные одновременно, выполняются один раз
+        self._map_downloads = {}
+        self._geocodes = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get(self, url, params, read):
+        params = {name: str(value) for name, value in params.items()}
+        for attempt in range(self.retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            try:
+                async with self._get_session().get(url, params=params) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                          status=response.status)
+                    response.raise_for_status()
+                    return await read(response)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUSES
+                if attempt >= self.retries or not retryable:
+                    raise
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def geocode(self, geocode_query):
+        """Forward geocoding; returns the parse_geocoder_response result or None."""
+        json_response = await self._get(GEOCODER_API_SERVER, geocoder_params_for(geocode_query=geocode_query),
+                                        lambda response: response.json(content_type=None))
+        return parse_geocoder_response(json_response)
+
+    async def reverse_geocode(self, coords):
+        """Reverse geocoding of a (longitude, latitude) point."""
+        json_response = await self._get(GEOCODER_API_SERVER, geocoder_params_for(coords=coords),
+                                        lambda response: response.json(content_type=None))
+        return parse_geocoder_response(json_response)
+
+    async def search_orgs(self, coords_lonlat, spn=ORG_BATCH_SPN, results=ORG_BATCH_RESULTS):
+        """Organizations around a point, parsed with parse_organization."""
+        json_response = await self._get(GEOSEARCH_API_SERVER, search_params_for(coords_lonlat, spn, results),
+                                        lambda response: response.json(content_type=None))
+        return [parse_organization(feature) for feature in json_response.get("features") or []]
+
+    async def geocode_cached(self, geocode_query=None, coords=None, cache=None):
+        """
+        Forward or reverse geocoding through the cache, the region pack and then the Geocoder API.
+
+        Cache and pack I/O runs in the default executor, so it does not
+        stall other coroutines. Identical concurrent requests share one
+        network call, and every call is timed as the "geocoder" endpoint.
+        In offline mode the network is never used.
+
+        Returns:
+            dict: Result of parse_geocoder_response, or None if nothing was found.
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: On network errors.
+            KeyError, ValueError: On malformed responses.
+        """
+        if not geocode_query and not coords:
+            return None
+        span = metrics.start("geocoder")
+        try:
+            loop = asyncio.get_running_loop()
+            with span.stage("lookup"):
+                result, source = await loop.run_in_executor(None, lookup_geocode, geocode_query, coords, cache)
+            if source is not None:
+                span.set(cache=source)
+                span.finish()
+                return result
+
+            span.set(cache="network")
+            key = geocoder_flight_key(geocode_query, coords)
+            request = self._geocodes.get(key)
+            if request is None:
+                print(f"   Запрос Геокодер ({'address' if geocode_query else 'reverse'}): {key}")
+                request = asyncio.ensure_future(self._geocode_network(geocode_query, coords, cache))
+                self._geocodes[key] = request
+                request.add_done_callback(lambda _: self._geocodes.pop(key, None))
+            with span.stage("network"):
+                result = await asyncio.shield(request)
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            span.finish(error=True)
+            raise
+        span.finish()
+        return result
+
+    async def _geocode_network(self, geocode_query, coords, cache):
+        result = await (self.geocode(geocode_query) if geocode_query else self.reverse_geocode(coords))
+        report_geocode_result(result)
+        if cache is not None and result is not None:
+            await asyncio.get_running_loop().run_in_executor(None, store_geocode_result, cache, geocode_query,
+                                                             coords, result)
+        return result
+
+    async def fetch_static_map(self, map_params, cache=None, disk_cache=None, tile_store=None, derived_cache=None):
+        """
+        Raw image bytes for map_params from the same caches and in the same order as fetch_map_data.
+
+        Cache lookups and writes run in the default executor, so disk I/O
+        does not stall other coroutines.
+        """
+        loop = asyncio.get_running_loop()
+        data, _ = await loop.run_in_executor(None, functools.partial(
+            lookup_map_data, map_params, cache, disk_cache, self.rate_limiter, tile_store, derived_cache))
+        if data is not None:
+            return data
+
+        key = make_map_cache_key(map_params)
+        download = self._map_downloads.get(key)
+        if download is None:
+            download = asyncio.ensure_future(
+                self._download_map(map_params, cache, disk_cache, tile_store, derived_cache))
+            self._map_downloads[key] = download
+            download.add_done_callback(lambda _: self._map_downloads.pop(key, None))
+        # Отмена одного ожидающего не должна прерывать загрузку для остальных
+        return await asyncio.shield(download)
+
+    async def _download_map(self, map_params, cache, disk_cache, tile_store, derived_cache):
+        async def read_image(response):
+            if not response.content_type.startswith("image/"):
+                raise MapResponseError(f"Неожиданный ответ сервера карт: {response.content_type}")
+            return await response.read()
+
+        data = await self._get(STATIC_MAPS_API_SERVER, map_params, read_image)
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+            store_map_data, map_params, data, cache, disk_cache, tile_store, derived_cache))
+        return data
+
+
+class YandexClient:
+    """
+    Synchronous facade over AsyncYandexClient.
+
+    Runs an event loop in a background thread. Blocking methods can be used
+    from plain threads; submit() returns a concurrent.futures.Future, which
+    lets Qt code start many requests at once and receive the results with
+    utils.qt_bridge.FutureBridge without blocking the GUI thread.
+    """
+
+    def __init__(self, **client_kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="yandex-client", daemon=True)
+        self._thread.start()
+        self.client = AsyncYandexClient(**client_kwargs)
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def geocode(self, geocode_query):
+        return self.submit(self.client.geocode(geocode_query)).result()
+
+    def reverse_geocode(self, coords):
+        return self.submit(self.client.reverse_geocode(coords)).result()
+
+    def search_orgs(self, coords_lonlat, spn=ORG_BATCH_SPN, results=ORG_BATCH_RESULTS):
+        return self.submit(self.client.search_orgs(coords_lonlat, spn, results)).result()
+
+    def geocode_cached(self, geocode_query=None, coords=None, cache=None):
+        return self.submit(self.client.geocode_cached(geocode_query, coords, cache)).result()
+
+    def fetch_static_map(self, map_params, cache=None, disk_cache=None, tile_store=None, derived_cache=None):
+        return self.submit(self.client.fetch_static_map(map_params, cache, disk_cache, tile_store,
+                                                        derived_cache)).result()
+
+    def run_blocking(self, function, *args):
+        """Runs a blocking function in the loop's executor; returns a concurrent.futures.Future."""
+        return self.submit(asyncio.to_thread(function, *args))
+
+    def close(self):
+        self.submit(self.client.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
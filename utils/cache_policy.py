@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config import CACHE_REFRESH_THREADS
+
+FRESH, STALE, EXPIRED = "fresh", "stale", "expired"
+
+
+class CachePolicy:
+    """
+    Stale-while-revalidate expiration policy.
+
+    Entries younger than soft_ttl are fresh. Entries between soft_ttl and
+    hard_ttl are stale: they are still served, but should be refreshed in
+    the background. Older entries are expired and must not be used.
+    Counters show how often each case happened.
+    """
+
+    def __init__(self, soft_ttl, hard_ttl):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self.served_fresh = 0
+        self.served_stale = 0
+        self.expired = 0
+
+    def state(self, created, now=None):
+        age = (now if now is not None else time.time()) - created
+        if age > self.hard_ttl:
+            return EXPIRED
+        if age > self.soft_ttl:
+            return STALE
+        return FRESH
+
+    def record(self, state):
+        if state == FRESH:
+            self.served_fresh += 1
+        elif state == STALE:
+            self.served_stale += 1
+        else:
+            self.expired += 1
+
+    def stats(self):
+        served = self.served_fresh + self.served_stale
+        return {"fresh": self.served_fresh, "stale": self.served_stale, "expired": self.expired,
+                "stale_ratio": self.served_stale / served if served else 0.0}
+
+
+class BackgroundRefresher:
+    """
+    Runs cache refresh jobs on a small thread pool.
+
+    A job for a key that is already queued or running is not submitted
+    again, so a stale entry requested many times is refreshed once.
+    """
+
+    def __init__(self, max_workers=CACHE_REFRESH_THREADS):
+        self.refreshes = 0
+        self.failures = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-refresh")
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            if key in self._active:
+                return False
+            self._active.add(key)
+        self._executor.submit(self._run, key, fn, args, kwargs)
+        return True
+
+    def _run(self, key, fn, args, kwargs):
+        try:
+            fn(*args, **kwargs)
+            self.refreshes += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"Не удалось обновить запись кэша: {e}")
+        finally:
+            with self._lock:
+                self._active.discard(key)
+
+
+refresher = BackgroundRefresher()
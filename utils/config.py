@@ -1,9 +1,70 @@
+import os
+
 # API Ключи (из урока) - учебные
 GEOCODER_API_KEY = "8013b162-6b42-4997-9691-77b7074026e0"
 STATIC_MAPS_API_KEY = "f3a0fe3a-b07e-4840-a1da-06f18b2ddf13"
 GEOSEARCH_API_KEY = "dda3ddba-c9ea-4ead-9010-f43fbc15c6e3"
 
-# API Серверы
-GEOCODER_API_SERVER = "http://geocode-maps.yandex.ru/1.x/"
-STATIC_MAPS_API_SERVER = "https://static-maps.yandex.ru/v1"
-GEOSEARCH_API_SERVER = "https://search-maps.yandex.ru/v1/"
\ No newline at end of file
+# API Серверы (переменные окружения позволяют подставить локальную заглушку stub_server.py)
+GEOCODER_API_SERVER = os.environ.get("MAP_VIEWER_GEOCODER_SERVER", "http://geocode-maps.yandex.ru/1.x/")
+STATIC_MAPS_API_SERVER = os.environ.get("MAP_VIEWER_STATIC_MAPS_SERVER", "https://static-maps.yandex.ru/v1")
+GEOSEARCH_API_SERVER = os.environ.get("MAP_VIEWER_GEOSEARCH_SERVER", "https://search-maps.yandex.ru/v1/")
+
+# Каталог кэшей; для замеров на заглушке стоит указать отдельный, чтобы не смешивать ответы
+CACHE_DIR = os.environ.get("MAP_VIEWER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "map_viewer"))
+
+# Кэширование карт
+MAP_MEMORY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+MAP_IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # декодированные изображения, около 256 тайлов
+MAP_DOWNLOAD_CHUNK_SIZE = 16 * 1024
+MAP_DISK_CACHE_DIR = os.path.join(CACHE_DIR, "maps")
+MAP_DISK_CACHE_MAX_BYTES = 256 * 1024 * 1024
+MAP_DISK_CACHE_INDEX_SAVE_INTERVAL = 30  # секунд между записями индекса
+# После мягкого срока запись ещё отдаётся, но обновляется в фоне; после жёсткого — удаляется
+MAP_CACHE_SOFT_TTL = 24 * 60 * 60  # секунд
+MAP_CACHE_HARD_TTL = 30 * 24 * 60 * 60  # секунд
+
+# Хранилище тайлов (SQLite в формате MBTiles)
+TILE_STORE_PATH = os.path.join(CACHE_DIR, "tiles.mbtiles")
+TILE_STORE_MMAP_SIZE = 256 * 1024 * 1024  # байт, 0 — без отображения файла в память
+TILE_STORE_BATCH_SIZE = 64  # тайлов в одной транзакции записи
+TILE_STORE_MAX_BYTES = 256 * 1024 * 1024  # данных тайлов в кэше просмотрщика
+TILE_STORE_PRUNE_TARGET = 0.9  # доля лимита, до которой очищается хранилище
+
+# Предзагрузка соседних видов
+PREFETCH_MAX_THREADS = 2
+PREFETCH_TILE_BUDGET = 12  # тайлов соседних видов при сдвиге, ближайшие к текущему виду первыми
+PREFETCH_ZOOM_DELAY_MS = 1000  # соседние масштабы загружаются, только если пользователь остановился
+PREFETCH_ZOOM_TILE_BUDGET = 6  # тайлов соседних масштабов
+
+# Фоновое обновление устаревших записей кэша
+CACHE_REFRESH_THREADS = 2
+
+# HTTP-клиент
+HTTP_POOL_SIZE = 8
+HTTP_CONNECT_TIMEOUT = 3.05  # секунд
+HTTP_READ_TIMEOUT = 10.0  # секунд
+HTTP_RETRIES = 2
+HTTP_BACKOFF_FACTOR = 0.3
+
+# Кэш геокодера
+GEOCODE_CACHE_FILE = os.path.join(CACHE_DIR, "geocode_cache.json")
+GEOCODE_CACHE_SOFT_TTL = 7 * 24 * 60 * 60  # секунд
+GEOCODE_CACHE_HARD_TTL = 90 * 24 * 60 * 60  # секунд
+GEOCODE_REVERSE_TOLERANCE_M = 15
+
+# Поиск организаций
+ORG_BATCH_SPN = 0.01  # градусов, размер области одного запроса к Geosearch
+ORG_BATCH_RESULTS = 50  # максимум, который отдаёт Geosearch
+ORG_GRID_CELL_DEG = 0.001
+ORG_MIN_BATCH_SPN = ORG_BATCH_SPN / 16  # меньше области не дробятся, даже если ответ полный
+ORG_LOAD_THREADS = 4  # четверти обрезанной области запрашиваются параллельно
+
+# Офлайн-режим: заранее загруженный пакет региона (MBTiles + снимок геокодера)
+OFFLINE_PACK_PATH = os.environ.get("MAP_VIEWER_OFFLINE_PACK", os.path.join(CACHE_DIR, "region.mbtiles"))
+OFFLINE_MODE = os.environ.get("MAP_VIEWER_OFFLINE", "") == "1"
+
+# Замеры задержек (выключены по умолчанию, MAP_VIEWER_METRICS=1 включает)
+METRICS_ENABLED = os.environ.get("MAP_VIEWER_METRICS", "") == "1"
+METRICS_DIR = os.environ.get("MAP_VIEWER_METRICS_DIR", os.path.join(CACHE_DIR, "metrics"))
+METRICS_WINDOW = 1000  # последних замеров для процентилей
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.cache_policy import CachePolicy, EXPIRED, STALE
+from utils.config import (MAP_DISK_CACHE_DIR, MAP_DISK_CACHE_MAX_BYTES, MAP_DISK_CACHE_INDEX_SAVE_INTERVAL,
+                          MAP_CACHE_SOFT_TTL, MAP_CACHE_HARD_TTL)
+
+INDEX_FILE_NAME = "index.json"
+
+
+def hash_cache_key(key):
+    """Returns a stable hex digest for a cache key (tuple of strings)."""
+    return hashlib.sha1("|".join(key).encode("utf-8")).hexdigest()
+
+
+class DiskMapCache:
+    """
+    Persistent cache of map images stored as files in a directory.
+
+    Files are named after a hash of the cache key. The index file keeps size,
+    creation and last access time of every entry, which is used for
+    expiration according to the cache policy and least-recently-used
+    eviction once max_bytes is exceeded. In memory the index is kept in
+    access order; it is written at most every save_interval seconds and
+    by save_index(), which owners call on exit.
+    """
+
+    def __init__(self, directory=MAP_DISK_CACHE_DIR, max_bytes=MAP_DISK_CACHE_MAX_BYTES, policy=None,
+                 save_interval=MAP_DISK_CACHE_INDEX_SAVE_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.save_interval = save_interval
+        self.policy = policy if policy is not None else CachePolicy(MAP_CACHE_SOFT_TTL, MAP_CACHE_HARD_TTL)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._index = OrderedDict()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.png")
+
+    def _load_index(self):
+        index_path = os.path.join(self.directory, INDEX_FILE_NAME)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        # Записи без файла на диске не нужны, а файлы без записи (индекс не успели
+        # сохранить) добавляются по времени изменения, чтобы учитываться в лимите
+        entries = {}
+        with os.scandir(self.directory) as files:
+            for file in files:
+                digest, extension = os.path.splitext(file.name)
+                if extension != ".png":
+                    continue
+                entry = index.get(digest)
+                if entry is None:
+                    stat = file.stat()
+                    entry = {"size": stat.st_size, "created": stat.st_mtime, "accessed": stat.st_mtime}
+                    self._dirty = True
+                entries[digest] = entry
+        self._index = OrderedDict(sorted(entries.items(), key=lambda item: item[1]["accessed"]))
+        self.total_bytes = sum(entry["size"] for entry in self._index.values())
+
+    def save_index(self):
+        index_path = os.path.join(self.directory, INDEX_FILE_NAME)
+        tmp_path = index_path + ".tmp"
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._index)
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, index_path)
+            except OSError as e:
+                print(f"Ошибка записи индекса кэша карт: {e}")
+
+    def _remove(self, digest):
+        entry = self._index.pop(digest, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry["size"]
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            pass
+
+    def get(self, key):
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """
+        Reads an entry together with its freshness.
+
+        Returns:
+            tuple: (data, stale); data is None on a miss or for an expired entry.
+        """
+        digest = hash_cache_key(key)
+        now = time.time()
+
+        with self._lock:
+            entry = self._index.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            state = self.policy.state(entry["created"], now)
+            self.policy.record(state)
+            if state == EXPIRED:
+                self._remove(digest)
+                self._dirty = True
+                self.misses += 1
+                return None, False
+            entry["accessed"] = now
+            self._index.move_to_end(digest)
+            self._dirty = True
+
+        try:
+            with open(self._path(digest), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = mm[:]
+        except (OSError, ValueError):
+            with self._lock:
+                self._remove(digest)
+                self._dirty = True
+                self.misses += 1
+            return None, False
+
+        self.hits += 1
+        return data, state == STALE
+
+    def put(self, key, data):
+        size = len(data)
+        if size == 0 or size > self.max_bytes:
+            return
+
+        digest = hash_cache_key(key)
+        path = self._path(digest)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Ошибка записи в кэш карт: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            old = self._index.get(digest)
+            if old is not None:
+                self.total_bytes -= old["size"]
+            self._index[digest] = {"size": size, "created": now, "accessed": now}
+            self._index.move_to_end(digest)
+            self.total_bytes += size
+
+            # Самые давно использованные записи стоят в начале индекса
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._index)))
+            self._dirty = True
+            save_due = time.monotonic() - self._saved_at >= self.save_interval
+
+        if save_due:
+            self.save_index()
+
+    def clear(self):
+        with self._lock:
+            for digest in list(self._index):
+                self._remove(digest)
+            self._dirty = True
+        self.save_index()
+
+    def stats(self):
+        return {"entries": len(self._index), "bytes": self.total_bytes,
+                "hits": self.hits, "misses": self.misses, "policy": self.policy.stats()}
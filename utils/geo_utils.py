@@ -1,4 +1,78 @@
-import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_distances(points1_lonlat, points2_lonlat):
+    """
+    Vectorized great-circle distance using Haversine formula.
+
+    Inputs are array-likes of shape (..., 2) with (longitude, latitude) in degrees
+    and are broadcast against each other, so a single point can be compared with
+    an (N, 2) array, or two (N, 2) arrays can be compared pair by pair.
+
+    Args:
+        points1_lonlat (array-like): First points.
+        points2_lonlat (array-like): Second points.
+
+    Returns:
+        numpy.ndarray: Distances in kilometers with the broadcast shape of the inputs without the last axis.
+    """
+    points1 = np.radians(np.asarray(points1_lonlat, dtype=np.float64))
+    points2 = np.radians(np.asarray(points2_lonlat, dtype=np.float64))
+
+    lon1, lat1 = points1[..., 0], points1[..., 1]
+    lon2, lat2 = points2[..., 0], points2[..., 1]
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_matrix(points1_lonlat, points2_lonlat):
+    """
+    Distance matrix between two point sets.
+
+    Args:
+        points1_lonlat (array-like): (N, 2) array of (longitude, latitude).
+        points2_lonlat (array-like): (M, 2) array of (longitude, latitude).
+
+    Returns:
+        numpy.ndarray: (N, M) distances in kilometers.
+    """
+    points1 = np.asarray(points1_lonlat, dtype=np.float64).reshape(-1, 1, 2)
+    points2 = np.asarray(points2_lonlat, dtype=np.float64).reshape(1, -1, 2)
+    return haversine_distances(points1, points2)
+
+
+def nearest_k(point_lonlat, points_lonlat, k=1, max_distance_km=None):
+    """
+    Finds the k points closest to a given point.
+
+    Args:
+        point_lonlat (tuple): (longitude, latitude) of the query point.
+        points_lonlat (array-like): (N, 2) array of candidate points.
+        k (int): Number of neighbours to return.
+        max_distance_km (float): Optional cut-off; farther points are not returned.
+
+    Returns:
+        tuple: (indices, distances) arrays sorted by distance, distances in kilometers.
+    """
+    points = np.asarray(points_lonlat, dtype=np.float64).reshape(-1, 2)
+    distances = haversine_distances(point_lonlat, points)
+
+    if k < len(distances):
+        candidates = np.argpartition(distances, k)[:k]
+    else:
+        candidates = np.arange(len(distances))
+    indices = candidates[np.argsort(distances[candidates], kind="stable")]
+
+    if max_distance_km is not None:
+        indices = indices[distances[indices] <= max_distance_km]
+    return indices, distances[indices]
 
 
 def haversine_distance(point1_lonlat, point2_lonlat):
@@ -13,17 +87,4 @@ def haversine_distance(point1_lonlat, point2_lonlat):
     Returns:
         float: Distance in kilometers.
     """
-    lon1, lat1 = point1_lonlat
-    lon2, lat2 = point2_lonlat
-
-    R = 6371.0
-
-    lon1_rad, lat1_rad, lon2_rad, lat2_rad = map(math.radians, [lon1, lat1, lon2, lat2])
-
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    distance = R * c
-    return distance
+    return float(haversine_distances(point1_lonlat, point2_lonlat))
@@ -0,0 +1,174 @@
+import json
+import math
+import os
+import threading
+import time
+
+from utils.cache_policy import CachePolicy, EXPIRED, STALE
+from utils.config import (GEOCODE_CACHE_FILE, GEOCODE_CACHE_SOFT_TTL, GEOCODE_CACHE_HARD_TTL,
+                          GEOCODE_REVERSE_TOLERANCE_M)
+from utils.geo_utils import haversine_distance
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def normalize_query(query):
+    """Normalizes an address query: case, commas and repeated whitespace do not matter."""
+    return " ".join(query.lower().replace(",", " ").split())
+
+
+def _restore_result(result):
+    # JSON не хранит кортежи, а остальной код ожидает их
+    result = dict(result)
+    result["coords"] = tuple(result["coords"])
+    if result.get("bounds"):
+        result["bounds"] = tuple(tuple(corner) for corner in result["bounds"])
+    return result
+
+
+class GeocodeCache:
+    """
+    Cache of geocoder results with forward and reverse lookups.
+
+    Forward lookups are keyed by the normalized query string. Reverse lookups
+    use a uniform grid of buckets and return a cached result when the
+    requested point lies within tolerance_m of a previously resolved one.
+    Expiration follows a stale-while-revalidate CachePolicy: lookup_*()
+    also report whether the returned entry is stale and should be refreshed.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_FILE, policy=None, tolerance_m=GEOCODE_REVERSE_TOLERANCE_M):
+        self.path = path
+        self.policy = policy if policy is not None else CachePolicy(GEOCODE_CACHE_SOFT_TTL,
+                                                                    GEOCODE_CACHE_HARD_TTL)
+        self.tolerance_m = tolerance_m
+        self.cell_deg = tolerance_m / METERS_PER_DEGREE_LAT
+        self.hits = 0
+        self.misses = 0
+        self._forward = {}
+        self._reverse = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lon, lat):
+        return math.floor(lon / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def _expired(self, created, now):
+        return self.policy.state(created, now) == EXPIRED
+
+    def get_forward(self, query):
+        return self.lookup_forward(query)[0]
+
+    def lookup_forward(self, query):
+        """Returns (result, stale) for an address query; result is None on a miss."""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._forward.get(key)
+            state = self.policy.state(entry["created"], now) if entry is not None else EXPIRED
+            if entry is not None:
+                self.policy.record(state)
+            if state == EXPIRED:
+                self._forward.pop(key, None)
+                self.misses += 1
+                return None, False
+            self.hits += 1
+            return entry["result"], state == STALE
+
+    def put_forward(self, query, result):
+        with self._lock:
+            self._forward[normalize_query(query)] = {"created": time.time(), "result": result}
+
+    def get_reverse(self, coords):
+        return self.lookup_reverse(coords)[0]
+
+    def lookup_reverse(self, coords):
+        """Returns (result, stale) of the nearest cached point within tolerance; result is None on a miss."""
+        now = time.time()
+
+        best, best_rank, best_state = None, None, None
+        with self._lock:
+            for bucket, entry, distance in self._reverse_candidates(coords, now):
+                # Свежие записи предпочтительнее устаревших, среди равных — ближайшая
+                state = self.policy.state(entry["created"], now)
+                rank = (state == STALE, distance)
+                if best is None or rank < best_rank:
+                    best, best_rank, best_state = entry["result"], rank, state
+
+            if best is None:
+                self.misses += 1
+                return None, False
+            self.hits += 1
+            self.policy.record(best_state)
+        return best, best_state == STALE
+
+    def put_reverse(self, coords, result):
+        """Stores a reverse result; it replaces the nearest cached point within tolerance, if any."""
+        now = time.time()
+        entry = {"point": tuple(coords), "created": now, "result": result}
+        with self._lock:
+            # Обновление устаревшей записи приходит для точки в её окрестности: старая
+            # запись заменяется, а не остаётся рядом до истечения жёсткого срока
+            nearest = min(self._reverse_candidates(coords, now), key=lambda candidate: candidate[2], default=None)
+            if nearest is not None:
+                bucket, replaced, _ = nearest
+                bucket.remove(replaced)
+            self._reverse.setdefault(self._cell(*coords), []).append(entry)
+
+    def _reverse_candidates(self, coords, now):
+        # Вызывается под _lock: (bucket, entry, distance_m) неистёкших записей в пределах допуска
+        lon, lat = coords
+        cell_x, cell_y = self._cell(lon, lat)
+        # Ячейки квадратные в градусах, а по долготе градус короче, поэтому смотрим шире
+        lon_cells = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        candidates = []
+        for dx in range(-lon_cells, lon_cells + 1):
+            for dy in (-1, 0, 1):
+                bucket = self._reverse.get((cell_x + dx, cell_y + dy))
+                if not bucket:
+                    continue
+                bucket[:] = [entry for entry in bucket if not self._expired(entry["created"], now)]
+                for entry in bucket:
+                    distance = haversine_distance(coords, entry["point"]) * 1000
+                    if distance <= self.tolerance_m:
+                        candidates.append((bucket, entry, distance))
+        return candidates
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, entry in data.get("forward", {}).items():
+                if not self._expired(entry["created"], now):
+                    self._forward[key] = {"created": entry["created"],
+                                          "result": _restore_result(entry["result"])}
+            for entry in data.get("reverse", []):
+                if not self._expired(entry["created"], now):
+                    point = tuple(entry["point"])
+                    self._reverse.setdefault(self._cell(*point), []).append(
+                        {"point": point, "created": entry["created"],
+                         "result": _restore_result(entry["result"])})
+
+    def save(self):
+        with self._lock:
+            data = {"forward": self._forward,
+                    "reverse": [entry for bucket in self._reverse.values() for entry in bucket]}
+            text = json.dumps(data, ensure_ascii=False)
+
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Ошибка записи кэша геокодера: {e}")
+
+    def stats(self):
+        return {"forward": len(self._forward),
+                "reverse": sum(len(bucket) for bucket in self._reverse.values()),
+                "hits": self.hits, "misses": self.misses, "policy": self.policy.stats()}
@@ -0,0 +1,131 @@
+from utils.cache_policy import refresher
+from utils.config import GEOCODER_API_KEY, GEOCODER_API_SERVER, GEOCODE_REVERSE_TOLERANCE_M
+from utils.http_client import get_http_client
+from utils.metrics import metrics
+from utils.region_pack import get_region_pack, is_offline_mode
+
+
+def parse_geocoder_response(json_response):
+    """
+    Extracts the first found object from a Geocoder API response.
+
+    Returns:
+        dict: {"coords", "address", "postal_code", "bounds"} or None if nothing was found.
+    """
+    feature_member = json_response["response"]["GeoObjectCollection"]["featureMember"]
+    if not feature_member:
+        return None
+
+    geo_object = feature_member[0]["GeoObject"]
+    point_str = geo_object["Point"]["pos"]
+    found_coords = tuple(map(float, point_str.split(" ")))
+    address_meta = geo_object["metaDataProperty"]["GeocoderMetaData"]
+    full_address = address_meta.get("text", "Адрес не найден")
+    postal_code = address_meta.get("Address", {}).get("postal_code")
+
+    bounds = None
+    try:
+        envelope = geo_object["boundedBy"]["Envelope"]
+        lc_coords = tuple(map(float, envelope["lowerCorner"].split(" ")))
+        uc_coords = tuple(map(float, envelope["upperCorner"].split(" ")))
+        bounds = (lc_coords, uc_coords)
+    except (KeyError, IndexError, ValueError):
+        pass
+
+    return {"coords": found_coords, "address": full_address,
+            "postal_code": postal_code, "bounds": bounds}
+
+
+def geocoder_params_for(geocode_query=None, coords=None):
+    """Builds Geocoder API parameters for a forward or reverse request."""
+    geocoder_params = {"apikey": GEOCODER_API_KEY, "format": "json", "results": 1}
+    if geocode_query:
+        geocoder_params["geocode"] = geocode_query
+    else:
+        geocoder_params["geocode"] = f"{coords[0]:.6f},{coords[1]:.6f}"
+    return geocoder_params
+
+
+def geocode_request(geocode_query=None, coords=None):
+    """
+    Performs one Geocoder API request without caching or error handling.
+
+    Returns:
+        dict: Result of parse_geocoder_response, or None if nothing was found.
+
+    Raises:
+        requests.exceptions.RequestException: On network errors.
+        KeyError, ValueError: On malformed responses.
+    """
+    response = get_http_client().get(GEOCODER_API_SERVER, params=geocoder_params_for(geocode_query, coords))
+    response.raise_for_status()
+    metrics.add_bytes(len(response.content))
+    with metrics.stage("parse"):
+        return parse_geocoder_response(response.json())
+
+
+def geocoder_flight_key(geocode_query=None, coords=None):
+    """Key under which identical concurrent requests are shared: the Geocoder API "geocode" parameter."""
+    return geocoder_params_for(geocode_query, coords)["geocode"]
+
+
+def lookup_geocode(geocode_query=None, coords=None, cache=None):
+    """
+    Resolves an address or a point without the network: cache, region pack and offline mode.
+
+    Blocks on pack I/O. A stale cached result is returned and refreshed in
+    the background; in offline mode a miss is final.
+
+    Returns:
+        tuple: (result, source) where source is "memory", "stale", "pack" or "offline",
+            or (None, None) if the Geocoder API has to be asked.
+    """
+    request_type = "address" if geocode_query else "reverse"
+
+    if cache is not None:
+        cached, stale = cache.lookup_forward(geocode_query) if geocode_query else cache.lookup_reverse(coords)
+        if cached is not None:
+            print(f"   Геокодер (из кэша, {request_type}): {cached['address']}")
+            if stale:
+                # Устаревший ответ показываем сразу, а обновляем в фоне
+                refresher.submit(("geocode", geocode_query, coords), _refresh_geocode, geocode_query, coords, cache)
+                return cached, "stale"
+            return cached, "memory"
+
+    pack = get_region_pack()
+    if pack is not None:
+        if geocode_query:
+            packed = pack.get_forward(geocode_query)
+        else:
+            packed = pack.get_reverse(coords, GEOCODE_REVERSE_TOLERANCE_M)
+        if packed is not None:
+            print(f"   Геокодер (из пакета региона, {request_type}): {packed['address']}")
+            return packed, "pack"
+
+    if is_offline_mode():
+        print(f"   Геокодер: в офлайн-режиме объект не найден в пакете региона.")
+        return None, "offline"
+    return None, None
+
+
+def report_geocode_result(result):
+    """Prints the outcome of a Geocoder API request."""
+    if result is None:
+        print(f"   Геокодер: Объект не найден.")
+        return
+    postal_code = result["postal_code"]
+    print(f"   Геокодер вернул: {result['address']}" + (f", {postal_code}" if postal_code else ""))
+
+
+def store_geocode_result(cache, geocode_query, coords, result):
+    """Puts a Geocoder API result into the cache under the query or the point."""
+    if geocode_query:
+        cache.put_forward(geocode_query, result)
+    else:
+        cache.put_reverse(coords, result)
+
+
+def _refresh_geocode(geocode_query, coords, cache):
+    result = geocode_request(geocode_query, coords)
+    if result is not None:
+        store_geocode_result(cache, geocode_query, coords, result)
@@ -0,0 +1,87 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.config import (HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+                          HTTP_RETRIES, HTTP_BACKOFF_FACTOR)
+from utils.metrics import metrics
+
+
+class ApiClient:
+    """
+    HTTP client with one pooled keep-alive session per host.
+
+    Connections (and TLS sessions) are reused between requests, every request
+    has connect/read timeouts, and failed requests are retried with
+    exponential backoff on connection errors and 5xx responses.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 retries=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=(500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session_for(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._create_session()
+                self._sessions[host] = session
+            return session
+
+    def get(self, url, params=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.session_for(url)
+        if not metrics.enabled:
+            return session.get(url, params=params, **kwargs)
+
+        # Этап "request" длится до заголовков ответа (или до конца тела без stream=True);
+        # если соединение новое, в него вошли DNS, TCP и TLS
+        opened = self._connections_opened(session, url)
+        with metrics.stage("request"):
+            response = session.get(url, params=params, **kwargs)
+        metrics.annotate(connection="new" if self._connections_opened(session, url) > opened else "reused",
+                         status=response.status_code)
+        return response
+
+    @staticmethod
+    def _connections_opened(session, url):
+        # Сессия обслуживает один хост; при параллельных запросах счётчик приблизительный
+        pools = session.get_adapter(url).poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Returns the shared ApiClient used for all Yandex API requests."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
@@ -0,0 +1,20 @@
+from utils.config import MAP_IMAGE_CACHE_MAX_BYTES
+from utils.map_cache import MapCache
+
+
+class ImageCache(MapCache):
+    """
+    In-memory LRU cache of decoded map images (QImage).
+
+    Uses the same keys as MapCache but a separate budget, counted in bytes
+    of decoded pixels. A hit means the image is drawn without decoding.
+    QImage is safe to share between threads, so worker threads can fill
+    the cache. A refreshed map image drops its decoded copy (see the
+    derived_cache argument of fetch_map_data).
+    """
+
+    def __init__(self, max_bytes=MAP_IMAGE_CACHE_MAX_BYTES, policy=None):
+        super().__init__(max_bytes, policy)
+
+    def _size(self, image):
+        return image.sizeInBytes()
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.cache_policy import CachePolicy, EXPIRED, STALE
+from utils.config import MAP_MEMORY_CACHE_MAX_BYTES, MAP_CACHE_SOFT_TTL, MAP_CACHE_HARD_TTL
+
+
+# Параметры, которые определяют содержимое изображения карты
+MAP_KEY_FIELDS = ("ll", "spn", "z", "l", "size", "theme", "pt")
+
+
+def make_map_cache_key(map_params):
+    """
+    Builds a normalized cache key from Static Maps API parameters.
+
+    The API key and any other parameters that do not affect the image are ignored.
+
+    Args:
+        map_params (dict): Parameters built by build_static_map_params.
+
+    Returns:
+        tuple: Hashable key.
+    """
+    return tuple(str(map_params.get(field, "")) for field in MAP_KEY_FIELDS)
+
+
+class MapCache:
+    """
+    Thread-safe in-memory LRU cache of raw map images (PNG bytes).
+
+    Entries are evicted in least-recently-used order once the total size
+    of the stored images exceeds max_bytes. Like the disk tiers, entries
+    keep their creation time and expire according to the cache policy, so
+    a long-running viewer still revalidates what it keeps in memory.
+    """
+
+    def __init__(self, max_bytes=MAP_MEMORY_CACHE_MAX_BYTES, policy=None):
+        self.max_bytes = max_bytes
+        self.policy = policy if policy is not None else CachePolicy(MAP_CACHE_SOFT_TTL, MAP_CACHE_HARD_TTL)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """
+        Reads an entry together with its freshness.
+
+        Returns:
+            tuple: (data, stale); data is None on a miss or for an expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            data, created = entry
+            state = self.policy.state(created, now)
+            self.policy.record(state)
+            if state == EXPIRED:
+                del self._entries[key]
+                self.total_bytes -= self._size(data)
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data, state == STALE
+
+    def _size(self, data):
+        return len(data)
+
+    def put(self, key, data, created=None):
+        size = self._size(data)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (data, created if created is not None else time.time())
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.total_bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def _pop(self, key):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= self._size(old[0])
+
+    def discard(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.total_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "policy": self.policy.stats()}
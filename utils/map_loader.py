@@ -0,0 +1,246 @@
+import requests
+
+from PyQt6.QtCore import QBuffer, QIODevice, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QImageReader, QPainter, QPixmap
+
+from utils.image_cache import ImageCache
+from utils.map_cache import MapCache, make_map_cache_key
+from utils.metrics import metrics
+from utils.static_maps import MapResponseError, MapUnavailableOffline, fetch_map_data
+from utils.tiles import tile_map_params
+
+BACKGROUND_COLOR = QColor("lightgray")
+HEADER_PROBE_BYTES = 64
+
+
+class StreamingImageDecoder:
+    """
+    Collects a streamed image download in a QBuffer and decodes it with QImageReader.
+
+    The header is probed as soon as the first bytes arrive, so a body that
+    is not a readable image aborts the download early. Qt's image plugins
+    need the complete file, so the pixels are decoded once, straight from
+    the buffer, after the last chunk.
+    """
+
+    def __init__(self):
+        self.buffer = QBuffer()
+        self.buffer.open(QIODevice.OpenModeFlag.ReadWrite)
+        self._probed = False
+
+    def feed(self, chunk):
+        self.buffer.write(chunk)
+        if self._probed or self.buffer.size() < HEADER_PROBE_BYTES:
+            return
+        self.buffer.seek(0)
+        if not QImageReader(self.buffer).canRead():
+            raise MapResponseError("Ответ сервера карт не является изображением")
+        self._probed = True
+        self.buffer.seek(self.buffer.size())
+
+    def read(self):
+        """Returns the decoded QImage, or None if nothing was fed or the data is not an image."""
+        if self.buffer.size() == 0:
+            return None
+        self.buffer.seek(0)
+        image = QImageReader(self.buffer).read()
+        return None if image.isNull() else image
+
+
+def fetch_map_image(map_params, cache, disk_cache=None, tile_store=None, image_cache=None):
+    """
+    Loads a map image via fetch_map_data and decodes it.
+
+    Must not be called from the GUI thread: it blocks on disk and network I/O.
+    Images found in image_cache are returned without decoding; a downloaded
+    image is decoded from the streamed chunks.
+
+    Returns:
+        tuple: (data, image) with raw bytes (None for an image_cache hit) and
+        decoded QImage, image is None if the data could not be decoded.
+
+    Raises:
+        requests.exceptions.RequestException: On network errors.
+        MapResponseError: If the response is not an image.
+    """
+    with metrics.span("static_maps"):
+        key = make_map_cache_key(map_params)
+        if image_cache is not None:
+            image, stale = image_cache.lookup(key)
+            if image is not None and not stale:
+                metrics.annotate(cache="image")
+                return None, image
+
+        decoder = StreamingImageDecoder()
+        data, source = fetch_map_data(map_params, cache, disk_cache, tile_store=tile_store, sink=decoder,
+                                      derived_cache=image_cache)
+        # QPixmap нельзя создавать вне GUI-потока, поэтому декодируем в QImage
+        with metrics.stage("decode"):
+            image = decoder.read() if source == "network" else None
+            if image is None:
+                image = QImage()
+                if not image.loadFromData(data):
+                    return data, None
+        # Устаревшее изображение не кэшируется: его заменит обновление в фоне
+        if image_cache is not None and source != "stale":
+            image_cache.put(key, image)
+        return data, image
+
+
+class _FetchSignals(QObject):
+    # Сигналы испускаются из рабочего потока и доставляются в GUI-поток очередью
+    finished = pyqtSignal(int, int, QImage)
+    missing = pyqtSignal(int, int)
+    failed = pyqtSignal(int, str)
+
+
+class _MapFetchTask(QRunnable):
+    def __init__(self, loader, generation, slot, map_params):
+        super().__init__()
+        self.loader = loader
+        self.generation = generation
+        self.slot = slot
+        self.map_params = map_params
+
+    def run(self):
+        # Запрос мог устареть, пока задача стояла в очереди
+        if self.generation != self.loader.generation:
+            return
+
+        try:
+            _, image = fetch_map_image(self.map_params, self.loader.cache, self.loader.disk_cache,
+                                       self.loader.tile_store, self.loader.image_cache)
+            if image is not None:
+                self.loader.signals.finished.emit(self.generation, self.slot, image)
+            else:
+                self.loader.signals.failed.emit(self.generation, "Ошибка загрузки карты")
+        except MapUnavailableOffline:
+            self.loader.signals.missing.emit(self.generation, self.slot)
+        except requests.exceptions.RequestException as e:
+            self.loader.signals.failed.emit(self.generation, f"Ошибка сети:\n{e}")
+        except Exception as e:
+            self.loader.signals.failed.emit(self.generation, f"Ошибка:\n{e}")
+
+
+class MapLoader(QObject):
+    """
+    Loads static map images in a background thread pool.
+
+    A view is either a single image or a set of tiles composed into one
+    picture. Every request starts a new generation; responses belonging
+    to older generations are dropped, so only the latest view is shown.
+    Images already present in the memory or disk cache (tiles: in the tile
+    store) are shown without a network request, and recently shown ones
+    are kept decoded in image_cache and drawn without decoding. In offline
+    mode, parts missing from the region pack are left as background.
+    """
+    map_loaded = pyqtSignal(QPixmap)
+    map_failed = pyqtSignal(str)
+
+    def __init__(self, parent=None, max_threads=4, cache=None, disk_cache=None, tile_store=None,
+                 image_cache=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.cache = cache if cache is not None else MapCache()
+        self.image_cache = image_cache if image_cache is not None else ImageCache()
+        self.disk_cache = disk_cache
+        self.tile_store = tile_store
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.signals = _FetchSignals(self)
+        self.signals.finished.connect(self._on_finished)
+        self.signals.missing.connect(self._on_missing)
+        self.signals.failed.connect(self._on_failed)
+
+        self._canvas = None
+        self._placements = {}
+        self._missing = 0
+
+    def request(self, map_params):
+        """Loads a single image built from map_params."""
+        width, height = map(int, map_params["size"].split(","))
+        self.request_composed((width, height), [(0, 0, map_params)])
+
+    def request_tiles(self, viewport, map_type="map", theme="light"):
+        """Loads the window of a TileViewport composed from fixed tiles."""
+        pieces = [(offset_x, offset_y,
+                   tile_map_params(viewport.zoom, tile_x, tile_y, map_type=map_type, theme=theme))
+                  for tile_x, tile_y, offset_x, offset_y in viewport.visible_tiles()]
+        self.request_composed((viewport.width, viewport.height), pieces)
+
+    def request_composed(self, size, pieces):
+        """
+        Loads several images and draws them onto one canvas.
+
+        Args:
+            size (tuple): Canvas (width, height) in pixels.
+            pieces (list): (offset_x, offset_y, map_params) for every image.
+        """
+        self.generation += 1
+        # Задачи, которые ещё не начали выполняться, больше не нужны
+        self.pool.clear()
+
+        self._canvas = QImage(size[0], size[1], QImage.Format.Format_RGB32)
+        self._canvas.fill(BACKGROUND_COLOR)
+        self._placements = {}
+        self._missing = 0
+
+        for slot, (offset_x, offset_y, map_params) in enumerate(pieces):
+            key = make_map_cache_key(map_params)
+            # Устаревшие записи идут через задачу: она запускает обновление в фоне
+            image, stale = self.image_cache.lookup(key)
+            if image is not None and not stale:
+                self._draw(offset_x, offset_y, image)
+                continue
+
+            data, stale = self.cache.lookup(key)
+            if data is not None and not stale:
+                image = QImage()
+                if image.loadFromData(data):
+                    self.image_cache.put(key, image)
+                    self._draw(offset_x, offset_y, image)
+                    continue
+
+            self._placements[slot] = (offset_x, offset_y)
+            self.pool.start(_MapFetchTask(self, self.generation, slot, dict(map_params)))
+
+        if not self._placements:
+            self.map_loaded.emit(QPixmap.fromImage(self._canvas))
+
+    def cancel(self):
+        self.generation += 1
+        self.pool.clear()
+
+    def _draw(self, offset_x, offset_y, image):
+        painter = QPainter(self._canvas)
+        painter.drawImage(offset_x, offset_y, image)
+        painter.end()
+
+    def _on_finished(self, generation, slot, image):
+        if generation != self.generation or slot not in self._placements:
+            return
+        offset_x, offset_y = self._placements.pop(slot)
+        self._draw(offset_x, offset_y, image)
+        self._finish_if_complete()
+
+    def _on_missing(self, generation, slot):
+        if generation != self.generation or slot not in self._placements:
+            return
+        # В офлайн-режиме тайла за краем пакета нет: место остаётся фоном, остальной вид показывается
+        del self._placements[slot]
+        self._missing += 1
+        self._finish_if_complete()
+
+    def _finish_if_complete(self):
+        if self._placements:
+            return
+        if self._missing:
+            print(f"Нет в пакете региона: {self._missing} тайлов вида")
+        self.map_loaded.emit(QPixmap.fromImage(self._canvas))
+
+    def _on_failed(self, generation, message):
+        if generation != self.generation:
+            return
+        # Остальные части этого вида уже не нужны
+        self.cancel()
+        self.map_failed.emit(message)
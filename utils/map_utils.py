@@ -1,3 +1,6 @@
+from utils.config import STATIC_MAPS_API_KEY
+
+
 def get_map_params(geo_object):
     try:
         point = geo_object["Point"]["pos"]
@@ -32,6 +35,43 @@ def get_map_params(geo_object):
         return None
 
 
+def build_static_map_params(lon, lat, spn_lon=None, spn_lat=None, map_type="map", size=(600, 450),
+                            theme="light", marker=None, zoom=None, markers=None):
+    """
+    Builds request parameters for the Static Maps API.
+
+    Args:
+        lon (float), lat (float): Map center in degrees.
+        spn_lon (float), spn_lat (float): Visible span in degrees.
+        map_type (str): Map layer ("map", "sat", ...).
+        size (tuple): Image (width, height) in pixels.
+        theme (str): "light" or "dark".
+        marker (tuple): Optional (longitude, latitude) of a search marker.
+        zoom (int): Optional zoom level, used instead of the span when given.
+        markers (list): Optional (longitude, latitude) points drawn as additional markers.
+
+    Returns:
+        dict: Parameters for requests.get(STATIC_MAPS_API_SERVER, params=...).
+    """
+    map_params = {"ll": f"{lon:.6f},{lat:.6f}",
+                  "l": map_type,
+                  "size": f"{size[0]},{size[1]}",
+                  "apikey": STATIC_MAPS_API_KEY}
+
+    if zoom is not None:
+        map_params["z"] = str(zoom)
+    else:
+        map_params["spn"] = f"{spn_lon:.6f},{spn_lat:.6f}"
+
+    if theme == "dark":
+        map_params["theme"] = "dark"
+    points = ([marker] if marker else []) + list(markers or [])
+    if points:
+        map_params["pt"] = "~".join(f"{lon:.6f},{lat:.6f},pm2rdm" for lon, lat in points)
+
+    return map_params
+
+
 if __name__ == '__main__':
     test_geo_object = {
         "Point": {"pos": "37.617635 55.755814"},
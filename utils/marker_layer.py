@@ -0,0 +1,161 @@
+import csv
+import json
+import math
+
+import numpy as np
+from PyQt6.QtCore import QPointF, QRectF, Qt
+from PyQt6.QtGui import QColor, QFont, QPen
+
+from utils.projection import lat_to_merc_y, merc_y_to_lat
+from utils.tiles import TILE_SIZE, span_to_zoom
+
+CLUSTER_CELL_PX = 48  # размер ячейки кластеризации на экране
+POINT_RADIUS = 4
+CLUSTER_MIN_RADIUS = 9
+POINT_COLOR = QColor("#1e6fe0")
+POINT_OUTLINE_COLOR = QColor("white")
+
+LON_FIELDS = ("lon", "lng", "longitude", "x")
+LAT_FIELDS = ("lat", "latitude", "y")
+
+
+def load_points(path):
+    """
+    Reads points from a CSV file (lon/lat columns) or GeoJSON (Point and MultiPoint geometries).
+
+    Returns:
+        tuple: (lons, lats) NumPy arrays in degrees; rows without valid coordinates are skipped.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not valid JSON or a CSV has no coordinate columns.
+    """
+    lons, lats = [], []
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            fields = {name.strip().lower(): name for name in reader.fieldnames or ()}
+            lon_field = next((fields[name] for name in LON_FIELDS if name in fields), None)
+            lat_field = next((fields[name] for name in LAT_FIELDS if name in fields), None)
+            if lon_field is None or lat_field is None:
+                raise ValueError("в CSV нет столбцов с долготой и широтой")
+            for row in reader:
+                try:
+                    lon, lat = float(row[lon_field]), float(row[lat_field])
+                except (TypeError, ValueError):
+                    continue
+                lons.append(lon)
+                lats.append(lat)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        features = data.get("features", [data]) if isinstance(data, dict) else []
+        for feature in features:
+            geometry = feature.get("geometry", feature) or {}
+            if geometry.get("type") == "Point":
+                points = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPoint":
+                points = geometry["coordinates"]
+            else:
+                continue
+            for point in points:
+                lons.append(float(point[0]))
+                lats.append(float(point[1]))
+    return np.array(lons, dtype=np.float64), np.array(lats, dtype=np.float64)
+
+
+class _Clusters:
+    """Grid clusters of one zoom level, sorted by grid row for fast culling."""
+
+    def __init__(self, rows, lons, lats, merc_x, counts, cells):
+        self.rows = rows
+        self.lons = lons
+        self.lats = lats
+        self.merc_x = merc_x
+        self.counts = counts
+        self.cells = cells
+
+    def visible(self, merc_left, merc_top, merc_right, merc_bottom):
+        """Indices of clusters inside a rectangle given in normalized Mercator coordinates."""
+        first = np.searchsorted(self.rows, math.floor(merc_top * self.cells), side="left")
+        last = np.searchsorted(self.rows, math.floor(merc_bottom * self.cells), side="right")
+        in_x = (self.merc_x[first:last] >= merc_left) & (self.merc_x[first:last] <= merc_right)
+        return first + np.flatnonzero(in_x)
+
+
+class MarkerLayer:
+    """
+    Overlay with a large set of points.
+
+    Points are kept in NumPy arrays together with their normalized Mercator
+    coordinates. For every zoom level they are grouped into clusters on a
+    grid of CLUSTER_CELL_PX screen pixels; clusters are computed on first
+    use of a zoom and cached. Clusters are sorted by grid row, which serves
+    as the spatial index: a view only looks at the rows it covers. The
+    number of painted items is therefore bounded by the number of grid
+    cells on screen, however many points the layer holds.
+    """
+
+    def __init__(self, lons=(), lats=()):
+        self.set_points(lons, lats)
+
+    def set_points(self, lons, lats):
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.merc_x = (self.lons + 180.0) / 360.0
+        self.merc_y = lat_to_merc_y(self.lats)
+        self._clusters = {}
+
+    def clear(self):
+        self.set_points((), ())
+
+    def __len__(self):
+        return len(self.lons)
+
+    def clusters(self, zoom):
+        clusters = self._clusters.get(zoom)
+        if clusters is None:
+            clusters = self._clusters[zoom] = self._build_clusters(zoom)
+        return clusters
+
+    def _build_clusters(self, zoom):
+        cells = TILE_SIZE * 2 ** zoom // CLUSTER_CELL_PX + 1
+        cell_x = np.clip((self.merc_x * cells).astype(np.int64), 0, cells - 1)
+        cell_y = np.clip((self.merc_y * cells).astype(np.int64), 0, cells - 1)
+        keys, inverse, counts = np.unique(cell_y * cells + cell_x, return_inverse=True, return_counts=True)
+
+        # Кластер рисуется в центре масс своих точек
+        merc_x = np.bincount(inverse, weights=self.merc_x) / counts
+        merc_y = np.bincount(inverse, weights=self.merc_y) / counts
+        return _Clusters(keys // cells, merc_x * 360.0 - 180.0, merc_y_to_lat(merc_y),
+                         merc_x, counts, cells)
+
+    def paint(self, painter, projection):
+        if not len(self):
+            return
+
+        zoom = span_to_zoom(projection.lon_per_pixel * projection.width, projection.width)
+        margin = CLUSTER_CELL_PX
+        left, top = projection.screen_to_geo(-margin, -margin)
+        right, bottom = projection.screen_to_geo(projection.width + margin, projection.height + margin)
+
+        clusters = self.clusters(zoom)
+        indices = clusters.visible((float(left) + 180.0) / 360.0, float(lat_to_merc_y(top)),
+                                   (float(right) + 180.0) / 360.0, float(lat_to_merc_y(bottom)))
+        if not len(indices):
+            return
+        xs, ys = projection.geo_to_screen(clusters.lons[indices], clusters.lats[indices])
+
+        painter.setPen(QPen(POINT_OUTLINE_COLOR, 1.5))
+        painter.setBrush(POINT_COLOR)
+        font = QFont(painter.font())
+        font.setBold(True)
+        painter.setFont(font)
+        for x, y, count in zip(xs.tolist(), ys.tolist(), clusters.counts[indices].tolist()):
+            if count == 1:
+                painter.drawEllipse(QPointF(x, y), POINT_RADIUS, POINT_RADIUS)
+                continue
+            radius = CLUSTER_MIN_RADIUS + 3 * math.log10(count)
+            painter.drawEllipse(QPointF(x, y), radius, radius)
+            painter.drawText(QRectF(x - radius, y - radius, radius * 2, radius * 2),
+                             Qt.AlignmentFlag.AlignCenter, str(count))
@@ -0,0 +1,266 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from utils.config import METRICS_ENABLED, METRICS_DIR, METRICS_WINDOW
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _NullSpan:
+    """Span used while metrics are disabled: every method does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def stage(self, name):
+        return self
+
+    def set(self, **fields):
+        pass
+
+    def add_bytes(self, count):
+        pass
+
+    def finish(self, error=False):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Stage:
+    def __init__(self, span, name):
+        self.span = span
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stages = self.span.stages
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+class Span:
+    """
+    Timing of one call of an endpoint: total time, named stages, bytes and cache status.
+
+    Used as a context manager, the span is also the current span of the
+    thread, so nested helpers can add stages to it through Metrics.current().
+    Spans that cross the event loop are created with Metrics.start() and
+    closed with finish().
+    """
+
+    def __init__(self, metrics, endpoint):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.stages = {}
+        self.fields = {}
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._previous = None
+        self._finished = False
+
+    def __enter__(self):
+        self._previous = self.metrics.current()
+        self.metrics._local.span = self
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics._local.span = self._previous
+        self.finish(error=exc_type is not None)
+        return False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def finish(self, error=False):
+        if self._finished:
+            return
+        self._finished = True
+        self.metrics.record(self, time.perf_counter() - self.started, error)
+
+
+class _NestedSpan:
+    # Вложенный вызов того же пути (например, fetch_map_data внутри fetch_map_image)
+    # пишет этапы в уже открытый замер
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        return self.span
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Metrics:
+    """
+    Per-endpoint latency statistics of API calls and map rendering.
+
+    Every finished span adds its total and stage durations to rolling
+    windows of the last `window` samples, from which p50/p95/p99 are
+    computed on demand, and is appended to a JSONL log. snapshot() and
+    prometheus_text() export the aggregated state. When disabled, span()
+    returns a shared no-op object, so instrumented code costs one call.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, directory=METRICS_DIR, window=METRICS_WINDOW):
+        self.enabled = enabled
+        self.directory = directory
+        self.window = window
+        self._samples = defaultdict(lambda: defaultdict(lambda: deque(maxlen=self.window)))
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._log = None
+        if enabled:
+            atexit.register(self.close)
+
+    def current(self):
+        return getattr(self._local, "span", None)
+
+    def span(self, endpoint):
+        """Starts a span for the current thread; use it in a with statement."""
+        if not self.enabled:
+            return NULL_SPAN
+        current = self.current()
+        if current is not None and current.endpoint == endpoint:
+            return _NestedSpan(current)
+        return Span(self, endpoint)
+
+    def start(self, endpoint):
+        """Starts a span that is not tied to a thread; close it with finish()."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, endpoint)
+
+    def stage(self, name):
+        """Times a stage of the current thread's span (no-op without one)."""
+        current = self.current() if self.enabled else None
+        return current.stage(name) if current is not None else NULL_SPAN
+
+    def annotate(self, **fields):
+        current = self.current() if self.enabled else None
+        if current is not None:
+            current.set(**fields)
+
+    def add_bytes(self, count):
+        current = self.current() if self.enabled else None
+        if current is not None:
+            current.add_bytes(count)
+
+    def record(self, span, duration, error=False):
+        entry = {"ts": time.time(), "endpoint": span.endpoint, "duration_ms": duration * 1000,
+                 "stages_ms": {name: seconds * 1000 for name, seconds in span.stages.items()},
+                 "bytes": span.bytes, "error": error, **span.fields}
+        with self._lock:
+            samples = self._samples[span.endpoint]
+            samples["total"].append(duration)
+            for name, seconds in span.stages.items():
+                samples[name].append(seconds)
+            counters = self._counters[span.endpoint]
+            counters["calls"] += 1
+            counters["errors"] += error
+            counters["bytes"] += span.bytes
+            if "cache" in span.fields:
+                counters[f"cache:{span.fields['cache']}"] += 1
+            self._write_log(entry)
+
+    def _write_log(self, entry):
+        try:
+            if self._log is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._log = open(os.path.join(self.directory, "metrics.jsonl"), "a", encoding="utf-8", buffering=1)
+            self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Ошибка записи метрик: {e}")
+            self.enabled = False
+
+    def snapshot(self):
+        """
+        Aggregated statistics.
+
+        Returns:
+            dict: {endpoint: {"stages": {stage: {"count", "p50", "p95", "p99"}}, "counters": {...}}},
+            durations in seconds.
+        """
+        with self._lock:
+            samples = {endpoint: {stage: np.array(values) for stage, values in stages.items()}
+                       for endpoint, stages in self._samples.items()}
+            counters = {endpoint: dict(values) for endpoint, values in self._counters.items()}
+
+        result = {}
+        for endpoint, stages in samples.items():
+            stage_stats = {}
+            for stage, values in stages.items():
+                percentiles = np.percentile(values, [q * 100 for q in QUANTILES])
+                stage_stats[stage] = {"count": len(values),
+                                      **{f"p{round(q * 100)}": float(p) for q, p in zip(QUANTILES, percentiles)}}
+            result[endpoint] = {"stages": stage_stats, "counters": counters.get(endpoint, {})}
+        return result
+
+    def prometheus_text(self):
+        """Snapshot in the Prometheus text exposition format."""
+        summary = ["# TYPE map_viewer_stage_seconds summary"]
+        counters = defaultdict(list)
+        for endpoint, stats in sorted(self.snapshot().items()):
+            for stage, values in sorted(stats["stages"].items()):
+                labels = f'endpoint="{endpoint}",stage="{stage}"'
+                for q in QUANTILES:
+                    summary.append(f'map_viewer_stage_seconds{{{labels},quantile="{q}"}} '
+                                   f'{values[f"p{round(q * 100)}"]:.6f}')
+                summary.append(f"map_viewer_stage_seconds_count{{{labels}}} {values['count']}")
+            for name, value in sorted(stats["counters"].items()):
+                if name.startswith("cache:"):
+                    counters["cache"].append(f'map_viewer_cache_total{{endpoint="{endpoint}",'
+                                             f'status="{name[len("cache:"):]}"}} {value}')
+                else:
+                    counters[name].append(f'map_viewer_{name}_total{{endpoint="{endpoint}"}} {value}')
+
+        lines = summary
+        for name, samples in sorted(counters.items()):
+            lines.append(f"# TYPE map_viewer_{name}_total counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or os.path.join(self.directory, "metrics.prom")
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Ошибка записи метрик: {e}")
+
+    def close(self):
+        """Writes the Prometheus snapshot and closes the JSONL log."""
+        if not self._samples:
+            return
+        self.write_prometheus()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+metrics = Metrics()
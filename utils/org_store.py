@@ -0,0 +1,211 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config import (GEOSEARCH_API_KEY, GEOSEARCH_API_SERVER, ORG_BATCH_SPN, ORG_BATCH_RESULTS,
+                          ORG_GRID_CELL_DEG, ORG_MIN_BATCH_SPN, ORG_LOAD_THREADS)
+from utils.geo_utils import nearest_k
+from utils.http_client import get_http_client
+from utils.metrics import metrics
+from utils.region_pack import is_offline_mode
+from utils.single_flight import SingleFlight
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def parse_organization(feature):
+    """Converts a Geosearch feature to {"coords", "name", "address"}."""
+    org_meta = feature["properties"].get("CompanyMetaData", {})
+    point = feature["geometry"]["coordinates"]
+    return {"coords": (float(point[0]), float(point[1])),
+            "name": org_meta.get("name", "Без имени"),
+            "address": org_meta.get("address", "Без адреса")}
+
+
+def search_params_for(coords_lonlat, spn=ORG_BATCH_SPN, results=ORG_BATCH_RESULTS):
+    """Builds Geosearch API parameters for organizations around a point."""
+    return {
+        "apikey": GEOSEARCH_API_KEY,
+        "lang": "ru_RU",
+        "ll": f"{coords_lonlat[0]},{coords_lonlat[1]}",
+        "type": "biz",
+        "results": results,
+        "text": "организация",
+        "spn": f"{spn},{spn}",
+        "rspn": 1,
+    }
+
+
+def search_organizations(coords_lonlat, spn=ORG_BATCH_SPN, results=ORG_BATCH_RESULTS):
+    """
+    Requests organizations around a point from the Geosearch API.
+
+    Returns:
+        list: Parsed organizations (see parse_organization).
+
+    Raises:
+        requests.exceptions.RequestException: On network errors.
+    """
+    response = get_http_client().get(GEOSEARCH_API_SERVER, params=search_params_for(coords_lonlat, spn, results))
+    response.raise_for_status()
+    metrics.add_bytes(len(response.content))
+    with metrics.stage("parse"):
+        features = response.json().get("features") or []
+        return [parse_organization(feature) for feature in features]
+
+
+def _intersects(area, bounds):
+    return area[0] < bounds[2] and bounds[0] < area[2] and area[1] < bounds[3] and bounds[1] < area[3]
+
+
+class OrganizationStore:
+    """
+    Local spatial index of organizations loaded from Geosearch in batches.
+
+    A lookup outside the already covered areas fetches the organizations of
+    the squares of a fixed grid (batch_spn degrees) around the point once;
+    later lookups inside those squares are answered from a uniform grid
+    without requests. Geosearch orders results by relevance, so a full
+    batch says nothing about which part of its square is complete: such a
+    square is split into quarters, down to min_batch_spn, and only squares
+    whose batch was not full are marked as covered. The squares of one
+    level are requested concurrently.
+    """
+
+    def __init__(self, batch_spn=ORG_BATCH_SPN, batch_results=ORG_BATCH_RESULTS,
+                 cell_deg=ORG_GRID_CELL_DEG, min_batch_spn=ORG_MIN_BATCH_SPN, load_threads=ORG_LOAD_THREADS):
+        self.batch_spn = batch_spn
+        self.batch_results = batch_results
+        self.cell_deg = cell_deg
+        self.min_batch_spn = min_batch_spn
+        self.requests_made = 0
+        self._flights = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=load_threads, thread_name_prefix="geosearch")
+        self._covered = set()  # (min_lon, min_lat, max_lon, max_lat)
+        self._grid = {}
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def _cell(self, lon, lat):
+        return math.floor(lon / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def _radius_deg(self, lat, radius_m):
+        d_lat = radius_m / METERS_PER_DEGREE_LAT
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 0.01)
+        return d_lon, d_lat
+
+    def _bounds(self, coords_lonlat, radius_m):
+        lon, lat = coords_lonlat
+        d_lon, d_lat = self._radius_deg(lat, radius_m)
+        return lon - d_lon, lat - d_lat, lon + d_lon, lat + d_lat
+
+    def _area_covered(self, bounds):
+        # Вызывается под _lock. Области на сетке не пересекаются, поэтому
+        # достаточно, чтобы прямоугольник целиком покрывали загруженные квадраты
+        min_lon, min_lat, max_lon, max_lat = bounds
+        inside = [area for area in self._covered if _intersects(area, bounds)]
+        area_sum = sum((min(max_lon, area[2]) - max(min_lon, area[0])) *
+                       (min(max_lat, area[3]) - max(min_lat, area[1])) for area in inside)
+        return area_sum >= (max_lon - min_lon) * (max_lat - min_lat) * (1 - 1e-9)
+
+    def is_covered(self, coords_lonlat, radius_m):
+        """True if the whole circle of radius_m around the point was already loaded."""
+        bounds = self._bounds(coords_lonlat, radius_m)
+        with self._lock:
+            return self._area_covered(bounds)
+
+    def add(self, organizations, area=None):
+        """Adds organizations; area, if given, is a square whose organizations are now all known."""
+        with self._lock:
+            for org in organizations:
+                identity = (org["coords"], org["name"])
+                if identity in self._known:
+                    continue
+                self._known.add(identity)
+                self._grid.setdefault(self._cell(*org["coords"]), []).append(org)
+            # Соседние щелчки могут загрузить один квадрат одновременно: площадь
+            # в _area_covered складывается, поэтому повтор не должен в неё попасть
+            if area is not None and not self._area_covered(area):
+                self._covered.add(area)
+
+    def nearest_local(self, coords_lonlat, radius_m):
+        """Returns (organization, distance_m) of the nearest known organization within radius_m."""
+        lon, lat = coords_lonlat
+        d_lon, d_lat = self._radius_deg(lat, radius_m)
+        min_x, min_y = self._cell(lon - d_lon, lat - d_lat)
+        max_x, max_y = self._cell(lon + d_lon, lat + d_lat)
+
+        with self._lock:
+            candidates = [org for cell_x in range(min_x, max_x + 1)
+                          for cell_y in range(min_y, max_y + 1)
+                          for org in self._grid.get((cell_x, cell_y), ())]
+        if not candidates:
+            return None, None
+
+        indices, distances = nearest_k(coords_lonlat, [org["coords"] for org in candidates],
+                                       k=1, max_distance_km=radius_m / 1000)
+        if not len(indices):
+            return None, None
+        return candidates[indices[0]], float(distances[0]) * 1000
+
+    def load_area(self, coords_lonlat, radius_m):
+        """Loads the grid squares needed to cover the circle of radius_m around the point."""
+        bounds = self._bounds(coords_lonlat, radius_m)
+        min_x, min_y = math.floor(bounds[0] / self.batch_spn), math.floor(bounds[1] / self.batch_spn)
+        max_x, max_y = math.floor(bounds[2] / self.batch_spn), math.floor(bounds[3] / self.batch_spn)
+        pending = [(x * self.batch_spn, y * self.batch_spn, self.batch_spn)
+                   for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+        while pending:
+            squares = []
+            for min_lon, min_lat, spn in pending:
+                square = (min_lon, min_lat, min_lon + spn, min_lat + spn)
+                if not _intersects(square, bounds):
+                    continue
+                with self._lock:
+                    if self._area_covered(square):
+                        continue
+                squares.append((square, spn))
+
+            # Квадраты одного уровня не зависят друг от друга и запрашиваются одновременно
+            batches = self._executor.map(self._search_square, squares)
+            pending = []
+            for (square, spn), organizations in zip(squares, batches):
+                self.requests_made += 1
+                if len(organizations) < self.batch_results or spn / 2 < self.min_batch_spn:
+                    self.add(organizations, square)
+                    continue
+                # Ответ обрезан: найденное сохраняем, а полноту получаем по четвертям
+                self.add(organizations)
+                half = spn / 2
+                pending.extend((square[0] + dx, square[1] + dy, half) for dx in (0, half) for dy in (0, half))
+
+    def _search_square(self, square_spn):
+        (min_lon, min_lat, _, _), spn = square_spn
+        return search_organizations((min_lon + spn / 2, min_lat + spn / 2), spn, self.batch_results)
+
+    def find_nearest(self, coords_lonlat, radius_m):
+        """
+        Finds the nearest organization within radius_m of a point.
+
+        Returns:
+            tuple: (organization, distance_m), or (None, None) if there is none.
+
+        Raises:
+            requests.exceptions.RequestException: If the area had to be loaded and the request failed.
+        """
+        with metrics.span("geosearch"):
+            if is_offline_mode():
+                # Без сети ищем только среди уже загруженных организаций
+                print(f"   Поиск организации офлайн: {coords_lonlat}")
+                metrics.annotate(cache="offline")
+            elif not self.is_covered(coords_lonlat, radius_m):
+                print(f"   Запрос Geosearch около: {coords_lonlat}")
+                metrics.annotate(cache="network")
+                # Одновременные щелчки в одну ячейку сетки загружают область один раз
+                self._flights.do(self._cell(*coords_lonlat), self.load_area, coords_lonlat, radius_m)
+            else:
+                print(f"   Поиск организации в загруженной области: {coords_lonlat}")
+                metrics.annotate(cache="local")
+            with metrics.stage("lookup"):
+                return self.nearest_local(coords_lonlat, radius_m)
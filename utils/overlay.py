@@ -0,0 +1,65 @@
+from PyQt6.QtCore import QPointF, Qt
+from PyQt6.QtGui import QColor, QPainter, QPainterPath, QPen
+
+from utils.projection import MercatorProjection
+
+MARKER_COLOR = QColor("#e0301e")
+MARKER_OUTLINE_COLOR = QColor("#7a1209")
+MARKER_RADIUS = 9  # пикселей
+MARKER_HEIGHT = 28  # от острия до верха головки, пикселей
+
+
+def paint_pin(painter, x, y):
+    """Draws a map pin whose tip is at (x, y), similar to the pm2rdm marker of the Static Maps API."""
+    head_y = y - MARKER_HEIGHT + MARKER_RADIUS
+    path = QPainterPath(QPointF(x, y))
+    path.lineTo(x - MARKER_RADIUS * 0.8, head_y + MARKER_RADIUS * 0.6)
+    path.arcTo(x - MARKER_RADIUS, head_y - MARKER_RADIUS, MARKER_RADIUS * 2, MARKER_RADIUS * 2, 217, -254)
+    path.closeSubpath()
+
+    painter.setPen(QPen(MARKER_OUTLINE_COLOR, 1.5))
+    painter.setBrush(MARKER_COLOR)
+    painter.drawPath(path)
+    painter.setPen(Qt.PenStyle.NoPen)
+    painter.setBrush(QColor("white"))
+    painter.drawEllipse(QPointF(x, head_y), MARKER_RADIUS * 0.4, MARKER_RADIUS * 0.4)
+
+
+class SearchMarkerLayer:
+    """Overlay with the marker of the current search result."""
+
+    def __init__(self):
+        self.coords = None
+
+    def paint(self, painter, projection):
+        if self.coords is None:
+            return
+        x, y = projection.geo_to_screen(*self.coords)
+        # Острие может быть чуть ниже края, а головка ещё видна
+        if projection.contains(x, y, margin=MARKER_HEIGHT):
+            paint_pin(painter, float(x), float(y))
+
+
+def render_overlays(pixmap, viewport, layers):
+    """
+    Draws overlay layers on top of a base map.
+
+    The base map stays untouched (it is cached and reused), so markers
+    and other overlays can change without downloading the map again.
+
+    Args:
+        pixmap (QPixmap): Base map of viewport.
+        viewport (TileViewport): View the base map shows.
+        layers (list): Objects with a paint(painter, projection) method.
+
+    Returns:
+        QPixmap: Copy of pixmap with the layers drawn.
+    """
+    composed = pixmap.copy()
+    projection = MercatorProjection.from_viewport(viewport)
+    painter = QPainter(composed)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    for layer in layers:
+        layer.paint(painter, projection)
+    painter.end()
+    return composed
@@ -0,0 +1,108 @@
+import math
+
+import requests
+
+from PyQt6.QtCore import QObject, QRunnable, QThread, QThreadPool, QTimer
+
+from utils.config import (PREFETCH_MAX_THREADS, PREFETCH_TILE_BUDGET, PREFETCH_ZOOM_DELAY_MS,
+                          PREFETCH_ZOOM_TILE_BUDGET)
+from utils.map_cache import make_map_cache_key
+from utils.region_pack import is_offline_mode
+from utils.static_maps import MapResponseError, fetch_map_data
+from utils.tiles import TILE_SIZE, neighbour_viewports, tile_map_params
+
+
+class _PrefetchTask(QRunnable):
+    def __init__(self, prefetcher, generation, map_params):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.generation = generation
+        self.map_params = map_params
+
+    def run(self):
+        # Пользователь ушёл с вида, для которого задача была поставлена
+        if self.generation != self.prefetcher.generation:
+            return
+        if make_map_cache_key(self.map_params) in self.prefetcher.loader.cache:
+            return
+
+        try:
+            loader = self.prefetcher.loader
+            fetch_map_data(self.map_params, loader.cache, loader.disk_cache, tile_store=loader.tile_store,
+                           derived_cache=loader.image_cache)
+        except (requests.exceptions.RequestException, MapResponseError) as e:
+            # Отсутствие тайлов в пакете региона при офлайн-работе — не ошибка
+            if not is_offline_mode():
+                print(f"Ошибка при предзагрузке карты: {e}")
+
+
+class Prefetcher(QObject):
+    """
+    Speculatively loads tiles of the views reachable with one key press.
+
+    Runs on its own low-priority thread pool so it never delays the tiles
+    of the current view. To save API quota, every view prefetches at most
+    tile_budget tiles of the panned views, nearest to the current view
+    first; the zoomed views (zoom_tile_budget tiles) are prefetched only
+    after the user has stayed on the view for zoom_delay_ms. cancel()
+    drops all queued work.
+    """
+
+    def __init__(self, loader, parent=None, max_threads=PREFETCH_MAX_THREADS, tile_budget=PREFETCH_TILE_BUDGET,
+                 zoom_tile_budget=PREFETCH_ZOOM_TILE_BUDGET, zoom_delay_ms=PREFETCH_ZOOM_DELAY_MS):
+        super().__init__(parent)
+        self.loader = loader
+        self.generation = 0
+        self.tile_budget = tile_budget
+        self.zoom_tile_budget = zoom_tile_budget
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.pool.setThreadPriority(QThread.Priority.LowPriority)
+        self.zoom_timer = QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(zoom_delay_ms)
+        self.zoom_timer.timeout.connect(self._prefetch_zoom)
+        self._pending_zoom = None
+
+    def prefetch(self, viewport, move_step, map_type="map", theme="light"):
+        self.cancel()
+
+        neighbours = neighbour_viewports(viewport, move_step)
+        panned = [neighbour for neighbour in neighbours if neighbour.zoom == viewport.zoom]
+        zoomed = [neighbour for neighbour in neighbours if neighbour.zoom != viewport.zoom]
+        self._schedule(viewport, panned, self.tile_budget, map_type, theme)
+        # При удержании клавиш пользователь не задерживается на виде, и масштабы не запрашиваются
+        self._pending_zoom = (viewport, zoomed, map_type, theme)
+        self.zoom_timer.start()
+
+    def _prefetch_zoom(self):
+        if self._pending_zoom is None:
+            return
+        viewport, zoomed, map_type, theme = self._pending_zoom
+        self._pending_zoom = None
+        self._schedule(viewport, zoomed, self.zoom_tile_budget, map_type, theme)
+
+    def _schedule(self, viewport, neighbours, budget, map_type, theme):
+        candidates = {}
+        for neighbour in neighbours:
+            # Расстояние от центра тайла до центра текущего вида в пикселях его масштаба
+            scale = 2.0 ** (neighbour.zoom - viewport.zoom)
+            center_x, center_y = viewport.center_x * scale, viewport.center_y * scale
+            for tile_x, tile_y, offset_x, offset_y in neighbour.visible_tiles():
+                map_params = tile_map_params(neighbour.zoom, tile_x, tile_y, map_type=map_type, theme=theme)
+                key = make_map_cache_key(map_params)
+                if key in candidates or key in self.loader.cache:
+                    continue
+                distance = math.hypot(neighbour.left + offset_x + TILE_SIZE / 2 - center_x,
+                                      neighbour.top + offset_y + TILE_SIZE / 2 - center_y) / scale
+                candidates[key] = (distance, map_params)
+
+        nearest = sorted(candidates.values(), key=lambda candidate: candidate[0])[:budget]
+        for _, map_params in nearest:
+            self.pool.start(_PrefetchTask(self, self.generation, map_params))
+
+    def cancel(self):
+        self.generation += 1
+        self.pool.clear()
+        self.zoom_timer.stop()
+        self._pending_zoom = None
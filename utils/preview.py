@@ -0,0 +1,34 @@
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QPainter, QPixmap
+
+from utils.map_loader import BACKGROUND_COLOR
+
+
+def render_preview(pixmap, shown_viewport, target_viewport):
+    """
+    Shifts and scales an already displayed map to approximate another view.
+
+    Both views are placed on the Web Mercator world pixel grid, so the old
+    image is simply drawn where its corners land in the target view.
+
+    Args:
+        pixmap (QPixmap): Image of shown_viewport.
+        shown_viewport (TileViewport): View the pixmap was rendered for.
+        target_viewport (TileViewport): View to preview.
+
+    Returns:
+        QPixmap: Preview of target_viewport; uncovered areas are filled with the background.
+    """
+    scale = 2.0 ** (target_viewport.zoom - shown_viewport.zoom)
+    target_rect = QRectF(shown_viewport.left * scale - target_viewport.left,
+                         shown_viewport.top * scale - target_viewport.top,
+                         shown_viewport.width * scale,
+                         shown_viewport.height * scale)
+
+    preview = QPixmap(target_viewport.width, target_viewport.height)
+    preview.fill(BACKGROUND_COLOR)
+    painter = QPainter(preview)
+    painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+    painter.drawPixmap(target_rect, pixmap, QRectF(pixmap.rect()))
+    painter.end()
+    return preview
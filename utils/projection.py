@@ -0,0 +1,91 @@
+import numpy as np
+
+from utils.tiles import TILE_SIZE
+
+MIN_LAT, MAX_LAT = -85.05112878, 85.05112878
+MIN_LON, MAX_LON = -180.0, 180.0
+MAX_SIN_LAT = 0.999999
+
+
+def lat_to_merc_y(lat):
+    """Converts latitude in degrees to normalized Mercator y (0 at the top, 1 at the bottom)."""
+    lat_r = np.radians(np.clip(np.asarray(lat, dtype=np.float64), MIN_LAT, MAX_LAT))
+    sin_lat = np.clip(np.sin(lat_r), -MAX_SIN_LAT, MAX_SIN_LAT)
+    return 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+
+
+def merc_y_to_lat(merc_y):
+    """Inverse of lat_to_merc_y."""
+    g = np.pi * (1 - 2 * np.asarray(merc_y, dtype=np.float64))
+    return np.degrees(2 * np.arctan(np.exp(g)) - np.pi / 2)
+
+
+class MercatorProjection:
+    """
+    Conversion between map image pixels and geographic coordinates for one view.
+
+    Longitude is linear across the image and latitude follows the Mercator
+    projection between the top and bottom edges of the view. All per-view
+    constants are computed once, and both directions accept NumPy arrays.
+    """
+
+    def __init__(self, center_lon, merc_y_top, lon_per_pixel, merc_y_per_pixel, width, height):
+        self.center_lon = center_lon
+        self.width = width
+        self.height = height
+        self.lon_per_pixel = lon_per_pixel
+        self.merc_y_top = merc_y_top
+        self.merc_y_per_pixel = merc_y_per_pixel
+
+    @classmethod
+    def from_span(cls, center_lon, center_lat, spn_lon, spn_lat, width, height):
+        """View given by its center and span, as in Static Maps API requests with ll/spn."""
+        merc_y_top = float(lat_to_merc_y(center_lat + spn_lat / 2.0))
+        merc_y_bottom = float(lat_to_merc_y(center_lat - spn_lat / 2.0))
+        return cls(center_lon, merc_y_top, spn_lon / width, (merc_y_bottom - merc_y_top) / height, width, height)
+
+    @classmethod
+    def from_viewport(cls, viewport):
+        """Exact projection of a TileViewport, taken from its world-pixel frame."""
+        # В Меркаторе центр окна не лежит посередине между широтами краёв,
+        # поэтому границы берутся из мировых пикселей, из которых собраны тайлы
+        world_size = TILE_SIZE * 2 ** viewport.zoom
+        return cls(viewport.lon, viewport.top / world_size, 360.0 / world_size, 1.0 / world_size,
+                   viewport.width, viewport.height)
+
+    def screen_to_geo(self, x, y):
+        """
+        Converts pixel coordinates to geographic ones.
+
+        Args:
+            x, y (float or array-like): Pixel coordinates, (0, 0) is the top-left corner.
+
+        Returns:
+            tuple: (lon, lat) arrays in degrees, clamped to valid ranges.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        lon = self.center_lon + (x - self.width / 2.0) * self.lon_per_pixel
+        lat = merc_y_to_lat(self.merc_y_top + y * self.merc_y_per_pixel)
+        return np.clip(lon, MIN_LON, MAX_LON), np.clip(lat, MIN_LAT, MAX_LAT)
+
+    def geo_to_screen(self, lon, lat):
+        """
+        Converts geographic coordinates to pixel coordinates.
+
+        Args:
+            lon, lat (float or array-like): Coordinates in degrees.
+
+        Returns:
+            tuple: (x, y) float arrays; points outside the view get coordinates outside the image.
+        """
+        lon = np.asarray(lon, dtype=np.float64)
+        x = self.width / 2.0 + (lon - self.center_lon) / self.lon_per_pixel
+        y = (lat_to_merc_y(lat) - self.merc_y_top) / self.merc_y_per_pixel
+        return x, y
+
+    def contains(self, x, y, margin=0):
+        """Boolean mask of pixel coordinates lying inside the image (with an optional margin)."""
+        x = np.asarray(x)
+        y = np.asarray(y)
+        return (x >= -margin) & (x < self.width + margin) & (y >= -margin) & (y < self.height + margin)
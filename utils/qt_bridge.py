@@ -0,0 +1,27 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class FutureBridge(QObject):
+    """
+    Delivers the outcome of concurrent.futures.Future objects as Qt signals.
+
+    The done-callback runs in whatever thread finished the future (e.g. the
+    event loop thread of YandexClient); Qt queues the signal to the thread
+    of the connected slots, so they run in the GUI thread. Every outcome is
+    paired with the tag passed to watch().
+    """
+    finished = pyqtSignal(object, object)  # tag, result
+    failed = pyqtSignal(object, object)  # tag, exception
+
+    def watch(self, future, tag):
+        future.add_done_callback(lambda done: self._emit(done, tag))
+        return future
+
+    def _emit(self, future, tag):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.failed.emit(tag, error)
+        else:
+            self.finished.emit(tag, future.result())
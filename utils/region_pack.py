@@ -0,0 +1,99 @@
+import json
+import math
+import os
+import threading
+
+from utils.config import OFFLINE_PACK_PATH, OFFLINE_MODE
+from utils.geo_utils import haversine_distances
+from utils.geocode_cache import METERS_PER_DEGREE_LAT, _restore_result, normalize_query
+from utils.tile_store import TileStore, tile_style
+
+GEOCODE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (query TEXT PRIMARY KEY, result TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS reverse_geocodes (lon REAL NOT NULL, lat REAL NOT NULL, result TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS reverse_geocodes_lat_lon ON reverse_geocodes (lat, lon);
+"""
+
+
+class RegionPack(TileStore):
+    """
+    Pre-seeded region archive for offline use.
+
+    A TileStore holding tiles of one map style (named in metadata) plus a
+    snapshot of geocoder results for forward and reverse lookups. Tiles in
+    a pack never expire.
+    """
+
+    def __init__(self, path=OFFLINE_PACK_PATH):
+        super().__init__(path)
+        self._writer.executescript(GEOCODE_SCHEMA)
+        self.style = self.get_metadata("style") or tile_style()
+
+    def set_metadata(self, values):
+        super().set_metadata(values)
+        if "style" in values:
+            self.style = str(values["style"])
+
+    def get_tile(self, zoom, tile_x, tile_y):
+        return self.get(zoom, tile_x, tile_y, self.style)
+
+    def put_tiles(self, tiles):
+        """Writes (zoom, tile_x, tile_y, data) tuples in one transaction."""
+        self.put_many(tiles, self.style)
+
+    def put_geocodes(self, items):
+        """Writes (query, coords, result) tuples: a forward and a reverse entry for each."""
+        with self._write_lock, self._writer:
+            for query, coords, result in items:
+                data = json.dumps(result, ensure_ascii=False)
+                if query:
+                    self._writer.execute("INSERT OR REPLACE INTO geocodes (query, result) VALUES (?, ?)",
+                                     (normalize_query(query), data))
+                point = coords or result["coords"]
+                self._writer.execute("INSERT INTO reverse_geocodes (lon, lat, result) VALUES (?, ?, ?)",
+                                 (point[0], point[1], data))
+
+    def get_forward(self, query):
+        row = self._reader().execute("SELECT result FROM geocodes WHERE query = ?",
+                                     (normalize_query(query),)).fetchone()
+        return _restore_result(json.loads(row[0])) if row else None
+
+    def get_reverse(self, coords, tolerance_m):
+        lon, lat = coords
+        d_lat = tolerance_m / METERS_PER_DEGREE_LAT
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 0.01)
+        rows = self._reader().execute(
+            "SELECT lon, lat, result FROM reverse_geocodes WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?",
+            (lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon)).fetchall()
+        if not rows:
+            return None
+
+        distances = haversine_distances(coords, [(row[0], row[1]) for row in rows]) * 1000
+        best = int(distances.argmin())
+        if distances[best] > tolerance_m:
+            return None
+        return _restore_result(json.loads(rows[best][2]))
+
+
+_pack = None
+_pack_lock = threading.Lock()
+_offline_mode = OFFLINE_MODE
+
+
+def get_region_pack():
+    """Returns the configured RegionPack, or None if the pack file does not exist."""
+    global _pack
+    with _pack_lock:
+        if _pack is None and os.path.exists(OFFLINE_PACK_PATH):
+            _pack = RegionPack(OFFLINE_PACK_PATH)
+        return _pack
+
+
+def is_offline_mode():
+    return _offline_mode
+
+
+def set_offline_mode(enabled):
+    """In offline mode maps and addresses are served only from the region pack."""
+    global _offline_mode
+    _offline_mode = bool(enabled)
@@ -0,0 +1,213 @@
+import json
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from PyQt6.QtCore import QPointF, Qt
+from PyQt6.QtGui import QColor, QPen, QPolygonF
+
+from utils.geo_utils import haversine_distances
+from utils.projection import lat_to_merc_y
+from utils.tiles import MAX_ZOOM, MIN_ZOOM, TILE_SIZE, span_to_zoom
+
+SIMPLIFY_TOLERANCE_PX = 0.75  # отклонение упрощённой линии от исходной на экране
+ROUTE_COLOR = QColor(124, 58, 237, 220)
+ROUTE_WIDTH = 4
+
+
+def load_tracks(path):
+    """
+    Reads polylines from a GPX file (tracks and routes) or GeoJSON (LineString, MultiLineString).
+
+    Returns:
+        list: (lons, lats) NumPy array pairs, one per line with at least two points.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be parsed.
+    """
+    lines = []
+    if path.lower().endswith(".gpx"):
+        try:
+            root = ET.parse(path).getroot()
+        except ET.ParseError as e:
+            raise ValueError(f"некорректный GPX: {e}") from e
+        # Пространство имён зависит от версии GPX, поэтому сравниваем только локальные имена
+        for element in root.iter():
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag not in ("trkseg", "rte"):
+                continue
+            points = [(float(point.get("lon")), float(point.get("lat"))) for point in element
+                      if point.tag.rsplit("}", 1)[-1] in ("trkpt", "rtept")]
+            lines.append(points)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        features = data.get("features", [data]) if isinstance(data, dict) else []
+        for feature in features:
+            geometry = feature.get("geometry", feature) or {}
+            if geometry.get("type") == "LineString":
+                lines.append(geometry["coordinates"])
+            elif geometry.get("type") == "MultiLineString":
+                lines.extend(geometry["coordinates"])
+
+    tracks = []
+    for points in lines:
+        if len(points) >= 2:
+            coords = np.asarray(points, dtype=np.float64)[:, :2]
+            tracks.append((coords[:, 0], coords[:, 1]))
+    return tracks
+
+
+def douglas_peucker_significance(x, y):
+    """
+    Runs Douglas–Peucker once for all tolerances.
+
+    All segments of one recursion depth are processed together with array
+    operations, so the number of Python-level iterations equals the depth
+    of the recursion, not the number of vertices.
+
+    Args:
+        x, y (numpy.ndarray): Vertex coordinates in a planar (e.g. Mercator) system.
+
+    Returns:
+        numpy.ndarray: For every vertex the largest tolerance at which Douglas–Peucker
+        still keeps it; the end points get infinity. Simplifying with tolerance t
+        keeps exactly the vertices whose value is greater than t.
+    """
+    count = len(x)
+    significance = np.zeros(count)
+    significance[[0, -1]] = np.inf
+    starts = np.array([0])
+    ends = np.array([count - 1])
+    limits = np.array([np.inf])
+
+    while len(starts):
+        lengths = ends - starts - 1
+        has_interior = lengths > 0
+        starts, ends, limits, lengths = (starts[has_interior], ends[has_interior],
+                                         limits[has_interior], lengths[has_interior])
+        if not len(starts):
+            break
+
+        # Внутренние вершины всех отрезков идут подряд, отрезок за отрезком
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        first = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        vertex = np.arange(len(segment)) - first[segment] + starts[segment] + 1
+
+        ax, ay = x[starts][segment], y[starts][segment]
+        dx, dy = x[ends][segment] - ax, y[ends][segment] - ay
+        length_sq = dx * dx + dy * dy
+        t = np.clip(((x[vertex] - ax) * dx + (y[vertex] - ay) * dy) / np.where(length_sq > 0, length_sq, 1), 0, 1)
+        distance = np.hypot(x[vertex] - ax - t * dx, y[vertex] - ay - t * dy)
+
+        max_distance = np.maximum.reduceat(distance, first)
+        is_max = np.flatnonzero(distance == max_distance[segment])
+        _, first_max = np.unique(segment[is_max], return_index=True)
+        split = vertex[is_max[first_max]]
+
+        # Вершина остаётся, только если остались все «родительские» вершины
+        value = np.minimum(max_distance, limits)
+        significance[split] = value
+        starts, ends, limits = (np.concatenate((starts, split)), np.concatenate((split, ends)),
+                                np.concatenate((value, value)))
+    return significance
+
+
+class _Track:
+    def __init__(self, lons, lats):
+        self.lons = lons
+        self.lats = lats
+        self.merc_x = (lons + 180.0) / 360.0
+        self.merc_y = lat_to_merc_y(lats)
+
+        points = np.column_stack((lons, lats))
+        segment_km = haversine_distances(points[:-1], points[1:])
+        self.distance_km = np.concatenate(([0.0], np.cumsum(segment_km)))
+
+        significance = douglas_peucker_significance(self.merc_x, self.merc_y)
+        self.levels = {}
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            tolerance = SIMPLIFY_TOLERANCE_PX / (TILE_SIZE * 2 ** zoom)
+            self.levels[zoom] = np.flatnonzero(significance > tolerance)
+
+    @property
+    def length_km(self):
+        return float(self.distance_km[-1])
+
+    def visible_runs(self, zoom, merc_left, merc_top, merc_right, merc_bottom):
+        """
+        Splits the simplified line into runs of consecutive segments crossing the view.
+
+        Returns:
+            list: Arrays of vertex indices, one per run.
+        """
+        indices = self.levels[zoom]
+        x, y = self.merc_x[indices], self.merc_y[indices]
+        x0, x1 = x[:-1], x[1:]
+        y0, y1 = y[:-1], y[1:]
+        visible = ((np.maximum(x0, x1) >= merc_left) & (np.minimum(x0, x1) <= merc_right) &
+                   (np.maximum(y0, y1) >= merc_top) & (np.minimum(y0, y1) <= merc_bottom))
+        if not visible.any():
+            return []
+
+        edges = np.diff(np.concatenate(([0], visible.astype(np.int8), [0])))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        return [indices[start:end + 1] for start, end in zip(run_starts, run_ends)]
+
+
+class RouteLayer:
+    """
+    Overlay with polylines (GPS tracks, routes).
+
+    Douglas–Peucker is run once per line when it is added and yields the
+    simplified vertex set for every zoom level, with an error below
+    SIMPLIFY_TOLERANCE_PX on screen. Painting selects the level of the
+    current zoom and only the runs of segments crossing the view, so the
+    cost of a frame depends on what is visible rather than on the size of
+    the track.
+    """
+
+    def __init__(self):
+        self.tracks = []
+
+    def add_track(self, lons, lats):
+        self.tracks.append(_Track(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)))
+
+    def clear(self):
+        self.tracks = []
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def length_km(self):
+        return sum(track.length_km for track in self.tracks)
+
+    def _view(self, projection):
+        zoom = span_to_zoom(projection.lon_per_pixel * projection.width, projection.width)
+        left, top = projection.screen_to_geo(-ROUTE_WIDTH, -ROUTE_WIDTH)
+        right, bottom = projection.screen_to_geo(projection.width + ROUTE_WIDTH, projection.height + ROUTE_WIDTH)
+        return zoom, ((float(left) + 180.0) / 360.0, float(lat_to_merc_y(top)),
+                      (float(right) + 180.0) / 360.0, float(lat_to_merc_y(bottom)))
+
+    def visible_length_km(self, projection):
+        """Length along the tracks of the parts crossing the view, in kilometers."""
+        zoom, bounds = self._view(projection)
+        return sum(float(track.distance_km[run[-1]] - track.distance_km[run[0]])
+                   for track in self.tracks for run in track.visible_runs(zoom, *bounds))
+
+    def paint(self, painter, projection):
+        if not self.tracks:
+            return
+        zoom, bounds = self._view(projection)
+
+        pen = QPen(ROUTE_COLOR, ROUTE_WIDTH)
+        pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+        pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
+        painter.setPen(pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        for track in self.tracks:
+            for run in track.visible_runs(zoom, *bounds):
+                xs, ys = projection.geo_to_screen(track.lons[run], track.lats[run])
+                painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())]))
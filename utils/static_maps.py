@@ -0,0 +1,199 @@
+from utils.cache_policy import refresher
+from utils.config import STATIC_MAPS_API_SERVER, MAP_DOWNLOAD_CHUNK_SIZE
+from utils.http_client import get_http_client
+from utils.map_cache import make_map_cache_key
+from utils.metrics import metrics
+from utils.region_pack import get_region_pack, is_offline_mode
+from utils.single_flight import SingleFlight
+from utils.tile_store import tile_style
+from utils.tiles import tile_from_params
+
+# Одинаковые запросы от загрузчика и предзагрузки выполняются один раз
+_map_flights = SingleFlight()
+
+
+class MapResponseError(Exception):
+    """The Static Maps API answered with something that is not an image."""
+
+
+class MapUnavailableOffline(MapResponseError):
+    """The map is in neither the caches nor the region pack, and offline mode forbids the network."""
+
+
+class _StoredTile:
+    """Presents one z/x/y tile of a TileStore with the lookup/put interface of DiskMapCache."""
+
+    def __init__(self, tile_store, tile):
+        self.tile_store = tile_store
+        self.zoom, self.tile_x, self.tile_y, map_type, theme = tile
+        self.style = tile_style(map_type, theme)
+
+    def lookup(self, key):
+        return self.tile_store.lookup(self.zoom, self.tile_x, self.tile_y, self.style)
+
+    def put(self, key, data):
+        self.tile_store.put(self.zoom, self.tile_x, self.tile_y, data, self.style)
+
+
+def fetch_map_data(map_params, cache=None, disk_cache=None, rate_limiter=None, tile_store=None, sink=None,
+                   derived_cache=None):
+    """
+    Returns raw image bytes for map_params from the caches or the Static Maps API.
+
+    Does not depend on Qt, so it can be used by headless tools. Blocks on
+    disk and network I/O.
+
+    Args:
+        map_params (dict): Static Maps API parameters.
+        cache (MapCache): Optional in-memory cache.
+        disk_cache (DiskMapCache): Optional persistent cache.
+        rate_limiter (TokenBucket): Optional limiter applied to network requests only.
+        tile_store (TileStore): Optional persistent store used instead of disk_cache for tiles.
+        sink: Optional object whose feed(chunk) receives the body while it is downloaded.
+            It is not called when the data comes from a cache or from a concurrent
+            identical request.
+        derived_cache (MapCache): Optional cache of data derived from the image under
+            the same key (e.g. decoded images); the key is dropped from it when the
+            image is refreshed.
+
+    A stale memory or disk entry is returned immediately and refreshed in the
+    background; stale data is not copied into the memory cache.
+    Tiles found in the region pack are served from it; in offline mode the
+    network is never used.
+
+    Returns:
+        tuple: (data, source) where source is "memory", "pack", "disk", "stale" or "network".
+
+    Raises:
+        requests.exceptions.RequestException: On network errors.
+        MapResponseError: If the response is not an image.
+        MapUnavailableOffline: If the map is unavailable offline.
+    """
+    with metrics.span("static_maps"):
+        data, source = _fetch_map_data(map_params, cache, disk_cache, rate_limiter, tile_store, sink, derived_cache)
+        metrics.annotate(cache=source)
+        return data, source
+
+
+def _fetch_map_data(map_params, cache, disk_cache, rate_limiter, tile_store, sink, derived_cache):
+    key = make_map_cache_key(map_params)
+    disk_cache = _persistent_cache(map_params, disk_cache, tile_store)
+    data, source = _lookup_map_data(key, map_params, cache, disk_cache, rate_limiter, derived_cache)
+    if data is not None:
+        return data, source
+    return _refresh_map(key, map_params, cache, disk_cache, rate_limiter, sink, derived_cache), "network"
+
+
+def lookup_map_data(map_params, cache=None, disk_cache=None, rate_limiter=None, tile_store=None,
+                    derived_cache=None):
+    """
+    The cache part of fetch_map_data: memory, region pack, then the disk cache or tile store.
+
+    Blocks on disk I/O. Stale entries are served and refreshed in the
+    background exactly like in fetch_map_data.
+
+    Returns:
+        tuple: (data, source) as in fetch_map_data, or (None, None) if the image has to be downloaded.
+
+    Raises:
+        MapUnavailableOffline: If the map is not cached and offline mode is on.
+    """
+    key = make_map_cache_key(map_params)
+    disk_cache = _persistent_cache(map_params, disk_cache, tile_store)
+    return _lookup_map_data(key, map_params, cache, disk_cache, rate_limiter, derived_cache)
+
+
+def store_map_data(map_params, data, cache=None, disk_cache=None, tile_store=None, derived_cache=None):
+    """Puts downloaded image bytes for map_params into the same caches fetch_map_data uses."""
+    key = make_map_cache_key(map_params)
+    _store_map_data(key, data, cache, _persistent_cache(map_params, disk_cache, tile_store), derived_cache)
+
+
+def _persistent_cache(map_params, disk_cache, tile_store):
+    # Тайлы хранятся в хранилище тайлов, остальные изображения — в дисковом кэше
+    tile = tile_from_params(map_params)
+    if tile is not None and tile_store is not None:
+        return _StoredTile(tile_store, tile)
+    return disk_cache
+
+
+def _lookup_map_data(key, map_params, cache, disk_cache, rate_limiter, derived_cache):
+    if cache is not None:
+        data, stale = cache.lookup(key)
+        if data is not None:
+            if stale and not is_offline_mode():
+                refresher.submit(key, _refresh_map, key, dict(map_params), cache, disk_cache, rate_limiter,
+                                 derived_cache=derived_cache)
+                return data, "stale"
+            return data, "memory"
+
+    with metrics.stage("pack"):
+        data = _read_region_pack(tile_from_params(map_params))
+    if data is not None:
+        if cache is not None:
+            cache.put(key, data)
+        return data, "pack"
+
+    # Сначала пробуем постоянный кэш, чтобы не обращаться к сети
+    if disk_cache is not None:
+        with metrics.stage("disk"):
+            data, stale = disk_cache.lookup(key)
+        if data is not None:
+            if stale and not is_offline_mode():
+                refresher.submit(key, _refresh_map, key, dict(map_params), cache, disk_cache, rate_limiter,
+                                 derived_cache=derived_cache)
+                return data, "stale"
+            if cache is not None:
+                cache.put(key, data)
+            return data, "disk"
+
+    if is_offline_mode():
+        raise MapUnavailableOffline("Карта этого места недоступна в офлайн-режиме")
+    return None, None
+
+
+def _read_region_pack(tile):
+    if tile is None:
+        return None
+    pack = get_region_pack()
+    zoom, tile_x, tile_y, map_type, theme = tile
+    if pack is None or pack.style != tile_style(map_type, theme):
+        return None
+    return pack.get_tile(zoom, tile_x, tile_y)
+
+
+def _refresh_map(key, map_params, cache=None, disk_cache=None, rate_limiter=None, sink=None, derived_cache=None):
+    data = _map_flights.do(key, _download_map, map_params, rate_limiter, sink)
+    _store_map_data(key, data, cache, disk_cache, derived_cache)
+    return data
+
+
+def _store_map_data(key, data, cache, disk_cache, derived_cache):
+    if cache is not None:
+        cache.put(key, data)
+    if disk_cache is not None:
+        disk_cache.put(key, data)
+    if derived_cache is not None:
+        derived_cache.discard(key)
+
+
+def _download_map(map_params, rate_limiter=None, sink=None):
+    if rate_limiter is not None:
+        with metrics.stage("throttle"):
+            rate_limiter.acquire()
+    with get_http_client().get(STATIC_MAPS_API_SERVER, params=map_params, stream=True) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if not content_type.startswith("image/"):
+            raise MapResponseError(f"Неожиданный ответ сервера карт: {content_type or 'без типа'}")
+
+        # Тело читается частями, чтобы получатель мог обрабатывать его до конца загрузки
+        chunks = []
+        with metrics.stage("download"):
+            for chunk in response.iter_content(MAP_DOWNLOAD_CHUNK_SIZE):
+                if sink is not None:
+                    sink.feed(chunk)
+                chunks.append(chunk)
+    data = b"".join(chunks)
+    metrics.add_bytes(len(data))
+    return data
@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import threading
+import time
+
+from utils.cache_policy import EXPIRED, STALE
+from utils.config import TILE_STORE_PATH, TILE_STORE_MMAP_SIZE, TILE_STORE_BATCH_SIZE, TILE_STORE_PRUNE_TARGET
+
+# Таблица с rowid: при крупных BLOB-значениях WITHOUT ROWID заметно медленнее на запись
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS styled_tiles (
+    style TEXT NOT NULL,
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_data BLOB NOT NULL,
+    created INTEGER NOT NULL,
+    PRIMARY KEY (style, zoom_level, tile_column, tile_row)
+);
+CREATE INDEX IF NOT EXISTS styled_tiles_created ON styled_tiles (created);
+CREATE VIEW IF NOT EXISTS tiles AS
+    SELECT zoom_level, tile_column, tile_row, tile_data FROM styled_tiles
+    WHERE style = COALESCE((SELECT value FROM metadata WHERE name = 'style'), 'map/light');
+"""
+
+# Запросы — константные строки: модуль sqlite3 кэширует подготовленные выражения
+# каждого соединения по тексту запроса, поэтому они компилируются один раз
+SELECT_TILE = ("SELECT tile_data, created FROM styled_tiles "
+               "WHERE style = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?")
+INSERT_TILE = ("INSERT OR REPLACE INTO styled_tiles "
+               "(style, zoom_level, tile_column, tile_row, tile_data, created) VALUES (?, ?, ?, ?, ?, ?)")
+SELECT_ZOOM = "SELECT tile_column, tile_row FROM styled_tiles WHERE style = ? AND zoom_level = ?"
+SELECT_TOTAL_BYTES = "SELECT COALESCE(SUM(LENGTH(tile_data)), 0) FROM styled_tiles"
+SELECT_OLDEST = "SELECT rowid, LENGTH(tile_data) FROM styled_tiles ORDER BY created"
+DELETE_EXPIRED = "DELETE FROM styled_tiles WHERE created < ?"
+DELETE_TILE = "DELETE FROM styled_tiles WHERE rowid = ?"
+
+
+def tile_style(map_type="map", theme="light"):
+    """Name of a map style stored with the tiles, e.g. "map/light"."""
+    return f"{map_type}/{theme}"
+
+
+def _tms_row(zoom, tile_y):
+    # В MBTiles строки нумеруются снизу (схема TMS), в остальном коде — сверху
+    return (1 << zoom) - 1 - tile_y
+
+
+class TileStore:
+    """
+    Persistent z/x/y tile store in an SQLite file with the MBTiles layout.
+
+    Tiles of several styles share the styled_tiles table; the standard
+    MBTiles "tiles" view shows the style named in metadata. The database
+    runs in WAL mode, so readers in any thread (one connection per thread,
+    optionally memory-mapped) do not block the single writer. put() buffers
+    tiles and writes them in one transaction per batch_size tiles; buffered
+    tiles are already visible to lookups. Call flush() or close() to write
+    the rest.
+
+    With a CachePolicy tiles expire like other cache entries; without one
+    they are kept forever. With max_bytes, writes that push the tile data
+    over the limit delete expired tiles and then the oldest ones until
+    TILE_STORE_PRUNE_TARGET of the limit is used; freed pages are reused
+    by later writes.
+    """
+
+    def __init__(self, path=TILE_STORE_PATH, mmap_size=TILE_STORE_MMAP_SIZE, batch_size=TILE_STORE_BATCH_SIZE,
+                 policy=None, max_bytes=None):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.batch_size = batch_size
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.pruned = 0
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        # Действует только для нового файла: позволяет возвращать место после очистки
+        self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer.executescript(SCHEMA)
+        if max_bytes is not None:
+            self.total_bytes = self._writer.execute(SELECT_TOTAL_BYTES).fetchone()[0]
+            self._prune_if_needed()
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            if self.mmap_size:
+                connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.connection = connection
+        return connection
+
+    def get_metadata(self, name):
+        row = self._reader().execute("SELECT value FROM metadata WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_metadata(self, values):
+        with self._write_lock, self._writer:
+            self._writer.executemany("INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+                                     [(name, str(value)) for name, value in values.items()])
+
+    def get(self, zoom, tile_x, tile_y, style=tile_style()):
+        return self.lookup(zoom, tile_x, tile_y, style)[0]
+
+    def lookup(self, zoom, tile_x, tile_y, style=tile_style()):
+        """
+        Reads a tile together with its freshness.
+
+        Returns:
+            tuple: (data, stale); data is None on a miss or for an expired tile.
+        """
+        with self._pending_lock:
+            entry = self._pending.get((style, zoom, tile_x, tile_y))
+        if entry is None:
+            entry = self._reader().execute(SELECT_TILE, (style, zoom, tile_x, _tms_row(zoom, tile_y))).fetchone()
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        data, created = entry
+        state = None
+        if self.policy is not None:
+            state = self.policy.state(created)
+            self.policy.record(state)
+            if state == EXPIRED:
+                # Просроченный тайл будет перезаписан при следующей загрузке
+                self.misses += 1
+                return None, False
+        self.hits += 1
+        return data, state == STALE
+
+    def put(self, zoom, tile_x, tile_y, data, style=tile_style()):
+        with self._pending_lock:
+            self._pending[(style, zoom, tile_x, tile_y)] = (data, int(time.time()))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def put_many(self, tiles, style=tile_style()):
+        """Writes (zoom, tile_x, tile_y, data) tuples in one transaction."""
+        created = int(time.time())
+        rows = [(style, zoom, tile_x, _tms_row(zoom, tile_y), sqlite3.Binary(data), created)
+                for zoom, tile_x, tile_y, data in tiles]
+        with self._write_lock:
+            with self._writer:
+                self._writer.executemany(INSERT_TILE, rows)
+            self.total_bytes += sum(len(row[4]) for row in rows)
+            self._prune_if_needed()
+
+    def flush(self):
+        """Writes buffered tiles to the database."""
+        with self._write_lock:
+            with self._pending_lock:
+                pending = list(self._pending.items())
+            if not pending:
+                return
+            with self._writer:
+                self._writer.executemany(INSERT_TILE, [
+                    (style, zoom, tile_x, _tms_row(zoom, tile_y), sqlite3.Binary(data), created)
+                    for (style, zoom, tile_x, tile_y), (data, created) in pending])
+            self.total_bytes += sum(len(data) for _, (data, _) in pending)
+            self._prune_if_needed()
+            with self._pending_lock:
+                # Тайлы, обновлённые во время записи, остаются в буфере
+                for key, entry in pending:
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+    def _prune_if_needed(self):
+        # Вызывается под _write_lock. Заменённые тайлы total_bytes учитывает дважды,
+        # поэтому перед очисткой размер пересчитывается точно
+        if self.max_bytes is None or self.total_bytes <= self.max_bytes:
+            return
+        self.total_bytes = self._writer.execute(SELECT_TOTAL_BYTES).fetchone()[0]
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        target = self.max_bytes * TILE_STORE_PRUNE_TARGET
+        with self._writer:
+            if self.policy is not None:
+                self.pruned += self._writer.execute(DELETE_EXPIRED,
+                                                    (int(time.time() - self.policy.hard_ttl),)).rowcount
+                self.total_bytes = self._writer.execute(SELECT_TOTAL_BYTES).fetchone()[0]
+            oldest = []
+            for rowid, size in self._writer.execute(SELECT_OLDEST):
+                if self.total_bytes <= target:
+                    break
+                oldest.append((rowid,))
+                self.total_bytes -= size
+            self._writer.executemany(DELETE_TILE, oldest)
+            self.pruned += len(oldest)
+        self._writer.execute("PRAGMA incremental_vacuum")
+
+    def existing_tiles(self, zoom, style=tile_style()):
+        """Set of (tile_x, tile_y) stored for a zoom level."""
+        rows = self._reader().execute(SELECT_ZOOM, (style, zoom))
+        return {(tile_x, _tms_row(zoom, tms_row)) for tile_x, tms_row in rows}
+
+    def count(self, style=None):
+        if style is None:
+            return self._reader().execute("SELECT COUNT(*) FROM styled_tiles").fetchone()[0]
+        return self._reader().execute("SELECT COUNT(*) FROM styled_tiles WHERE style = ?", (style,)).fetchone()[0]
+
+    def close(self):
+        """Flushes buffered tiles and closes the writer and this thread's reader."""
+        self.flush()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+        with self._write_lock:
+            self._writer.close()
+
+    def stats(self):
+        stats = {"hits": self.hits, "misses": self.misses, "pending": len(self._pending),
+                 "bytes": self.total_bytes, "pruned": self.pruned}
+        if self.policy is not None:
+            stats["policy"] = self.policy.stats()
+        return stats
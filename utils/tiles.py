@@ -0,0 +1,153 @@
+import math
+
+from utils.map_utils import build_static_map_params
+
+TILE_SIZE = 256
+MIN_ZOOM, MAX_ZOOM = 0, 21
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def lonlat_to_world(lon, lat, zoom):
+    """
+    Converts geographic coordinates to Web Mercator world pixels.
+
+    Args:
+        lon (float), lat (float): Coordinates in degrees.
+        zoom (int): Zoom level; the world is TILE_SIZE * 2**zoom pixels wide.
+
+    Returns:
+        tuple: (x, y) in world pixels, y grows southwards.
+    """
+    world_size = TILE_SIZE * 2 ** zoom
+    lat = max(-MAX_MERCATOR_LAT, min(lat, MAX_MERCATOR_LAT))
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0 * world_size
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * world_size
+    return x, y
+
+
+def world_to_lonlat(x, y, zoom):
+    """Inverse of lonlat_to_world."""
+    world_size = TILE_SIZE * 2 ** zoom
+    lon = x / world_size * 360.0 - 180.0
+    g = math.pi * (1 - 2 * y / world_size)
+    lat = math.degrees(2 * math.atan(math.exp(g)) - math.pi / 2)
+    return lon, lat
+
+
+def span_to_zoom(spn_lon, width):
+    """Returns the integer zoom level whose longitude span is closest to spn_lon."""
+    zoom = round(math.log2(360.0 * width / (TILE_SIZE * spn_lon)))
+    return max(MIN_ZOOM, min(zoom, MAX_ZOOM))
+
+
+class TileViewport:
+    """
+    Map window snapped to the Web Mercator tile grid.
+
+    The center is rounded to a whole world pixel and the zoom to an integer
+    level, so the visible window is always composed of the same fixed
+    z/x/y tiles and neighbouring views share most of them.
+    """
+
+    def __init__(self, lon, lat, zoom, width, height):
+        self.zoom = max(MIN_ZOOM, min(int(zoom), MAX_ZOOM))
+        self.width = width
+        self.height = height
+
+        world_size = TILE_SIZE * 2 ** self.zoom
+        x, y = lonlat_to_world(lon, lat, self.zoom)
+        self.center_x = round(x) % world_size
+        self.center_y = max(0, min(round(y), world_size))
+        self.lon, self.lat = world_to_lonlat(self.center_x, self.center_y, self.zoom)
+
+    @classmethod
+    def from_span(cls, lon, lat, spn_lon, width, height):
+        return cls(lon, lat, span_to_zoom(spn_lon, width), width, height)
+
+    @property
+    def left(self):
+        return self.center_x - self.width / 2.0
+
+    @property
+    def top(self):
+        return self.center_y - self.height / 2.0
+
+    def span(self):
+        """Returns (spn_lon, spn_lat) of the visible window in degrees."""
+        spn_lon = 360.0 * self.width / (TILE_SIZE * 2 ** self.zoom)
+        _, lat_top = world_to_lonlat(self.center_x, self.top, self.zoom)
+        _, lat_bottom = world_to_lonlat(self.center_x, self.top + self.height, self.zoom)
+        return spn_lon, lat_top - lat_bottom
+
+    def visible_tiles(self):
+        """
+        Lists tiles covering the window.
+
+        Returns:
+            list: (tile_x, tile_y, offset_x, offset_y) tuples, where the offsets
+            are the position of the tile's top-left corner in the window.
+        """
+        tiles_count = 2 ** self.zoom
+        first_x = math.floor(self.left / TILE_SIZE)
+        last_x = math.floor((self.left + self.width - 1) / TILE_SIZE)
+        first_y = max(0, math.floor(self.top / TILE_SIZE))
+        last_y = min(tiles_count - 1, math.floor((self.top + self.height - 1) / TILE_SIZE))
+
+        tiles = []
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                offset_x = round(tile_x * TILE_SIZE - self.left)
+                offset_y = round(tile_y * TILE_SIZE - self.top)
+                tiles.append((tile_x % tiles_count, tile_y, offset_x, offset_y))
+        return tiles
+
+    def key(self):
+        return self.zoom, self.center_x, self.center_y
+
+
+def tile_map_params(zoom, tile_x, tile_y, map_type="map", theme="light"):
+    """Builds Static Maps API parameters for a single z/x/y tile."""
+    lon, lat = world_to_lonlat((tile_x + 0.5) * TILE_SIZE, (tile_y + 0.5) * TILE_SIZE, zoom)
+    return build_static_map_params(lon, lat, map_type=map_type, size=(TILE_SIZE, TILE_SIZE),
+                                   theme=theme, zoom=zoom)
+
+
+def tile_from_params(map_params):
+    """
+    Recognizes parameters built by tile_map_params.
+
+    Returns:
+        tuple: (zoom, tile_x, tile_y, map_type, theme), or None for other requests.
+    """
+    if "z" not in map_params or "pt" in map_params or map_params.get("size") != f"{TILE_SIZE},{TILE_SIZE}":
+        return None
+    zoom = int(map_params["z"])
+    lon, lat = map(float, map_params["ll"].split(","))
+    x, y = lonlat_to_world(lon, lat, zoom)
+    return (zoom, math.floor(x / TILE_SIZE), math.floor(y / TILE_SIZE),
+            map_params.get("l", "map"), map_params.get("theme", "light"))
+
+
+def neighbour_viewports(viewport, move_step):
+    """
+    Returns viewports reachable from viewport with one navigation key.
+
+    Args:
+        viewport (TileViewport): Current view.
+        move_step (float): Pan step as a fraction of the visible span.
+
+    Returns:
+        list: Views after moving up, down, left, right, zooming in and out.
+    """
+    spn_lon, spn_lat = viewport.span()
+    width, height = viewport.width, viewport.height
+    moves = [(0, spn_lat * move_step), (0, -spn_lat * move_step),
+             (-spn_lon * move_step, 0), (spn_lon * move_step, 0)]
+
+    neighbours = [TileViewport(viewport.lon + d_lon, viewport.lat + d_lat, viewport.zoom, width, height)
+                  for d_lon, d_lat in moves]
+    for zoom in (viewport.zoom + 1, viewport.zoom - 1):
+        if MIN_ZOOM <= zoom <= MAX_ZOOM:
+            neighbours.append(TileViewport(viewport.lon, viewport.lat, zoom, width, height))
+    return neighbours